@@ -1,10 +1,13 @@
 """
 Script to add chapters to Java course
 """
-from app import app, db, Course, Chapter
+from app import app, db, Course, Chapter, init_db, seed_courses, db_execute
+from catalog_cache import bump_version
 import datetime
 
 with app.app_context():
+    init_db()
+    seed_courses()
     # Find Java course
     java_course = Course.query.filter_by(title='Java').first()
     
@@ -405,6 +408,8 @@ scanner.close();</code></pre>
                 )
                 db.session.add(chapter)
             
+            # Running web workers rebuild their chapter navigation
+            bump_version(db_execute)
             db.session.commit()
             print(f"Successfully added {len(java_chapters)} chapters to Java course!")
             print("Chapters added:")
@@ -2,49 +2,141 @@
 AI Learning Tracker for CourseHub
 Tracks student learning patterns and adapts course content
 """
-import sqlite3
+import os
+import threading
 from datetime import datetime, timedelta
 import json
+from sqlalchemy import bindparam, create_engine, text
+from progress_service import add_time_spent, rebuild_summary
+from sqlite_tuning import tune_sqlite
 
-DB_PATH = 'coursehub.db'
+# Same default database as the Flask app (instance/coursehub.db), or DATABASE_URL
+DB_URL = os.environ.get(
+    'DATABASE_URL',
+    'sqlite:///' + os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'coursehub.db')
+)
+
+# Statements are built once per process so their compiled form is cached
+# Progress aggregates come from course_progress_summary, kept current by progress_service
+SPEED_SQL = text("""
+    SELECT started_count, completed_count, total_time
+    FROM course_progress_summary
+    WHERE student_id = :student_id AND course_id = :course_id
+""")
+
+CHAPTER_SQL = text("""
+    SELECT content, checkpoint
+    FROM chapter
+    WHERE id = :chapter_id
+""")
+
+CHAPTER_PROGRESS_SQL = text("""
+    SELECT completed, time_spent
+    FROM student_progress
+    WHERE student_id = :student_id AND chapter_id = :chapter_id
+""")
+
+NEXT_CHAPTER_SQL = text("""
+    SELECT c.id, c.chapter_number, c.title,
+           CASE WHEN sp.completed THEN 1 ELSE 0 END as completed
+    FROM chapter c
+    LEFT JOIN student_progress sp ON c.id = sp.chapter_id AND sp.student_id = :student_id
+    WHERE c.course_id = :course_id
+    ORDER BY c.chapter_number
+""")
+
+# One round-trip for the whole report: course, chapter count and the
+# student's summary row (NULL summary columns mean it still has to be built)
+REPORT_SQL = text("""
+    SELECT 
+        co.title,
+        (SELECT COUNT(*) FROM chapter WHERE course_id = co.id) as total_chapters,
+        s.started_count,
+        s.completed_count,
+        s.total_time,
+        CASE WHEN s.started_count > 0 THEN s.total_time / s.started_count END as avg_time_per_chapter,
+        s.student_id
+    FROM course co
+    LEFT JOIN course_progress_summary s ON s.course_id = co.id AND s.student_id = :student_id
+    WHERE co.id = :course_id
+""")
+
+# Same columns for every approved student of a course in one pass
+COURSE_REPORTS_SQL = text("""
+    SELECT 
+        e.student_id,
+        co.title,
+        (SELECT COUNT(*) FROM chapter WHERE course_id = co.id) as total_chapters,
+        s.started_count,
+        s.completed_count,
+        s.total_time,
+        CASE WHEN s.started_count > 0 THEN s.total_time / s.started_count END as avg_time_per_chapter,
+        s.student_id
+    FROM enrollment e
+    JOIN course co ON co.id = e.course_id
+    LEFT JOIN course_progress_summary s ON s.student_id = e.student_id AND s.course_id = e.course_id
+    WHERE e.course_id = :course_id AND e.status = 'approved'
+""")
+
+# Same reports for one page of students
+COURSE_REPORTS_FOR_SQL = text(COURSE_REPORTS_SQL.text + " AND e.student_id IN :student_ids").bindparams(
+    bindparam('student_ids', expanding=True)
+)
+
+_engines = {}
+_engines_lock = threading.Lock()
+
+def get_engine(url=None):
+    """Pooled engine per database URL, shared by every tracker in the process"""
+    url = url or DB_URL
+    with _engines_lock:
+        engine = _engines.get(url)
+        if engine is None:
+            # WAL (see sqlite_tuning) lets tracker reads run alongside the app's writes
+            engine = tune_sqlite(create_engine(url, pool_pre_ping=True))
+            _engines[url] = engine
+        return engine
 
 class AILearningTracker:
-    def __init__(self):
-        self.db_path = DB_PATH
+    def __init__(self, engine=None, db_url=None, read_engine=None):
+        # Pass the Flask app's db.engine to share its pool; otherwise use a
+        # process-wide engine for db_url (default: DATABASE_URL / instance db).
+        # Reads go to read_engine (e.g. a replica) when given; writes never do.
+        self.engine = engine or get_engine(db_url)
+        self.read_engine = read_engine or self.engine
     
     def get_connection(self):
-        return sqlite3.connect(self.db_path)
+        return self.read_engine.connect()
     
     def calculate_learning_speed(self, student_id, course_id):
         """Calculate how fast a student is learning"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        # Get all progress for this course
-        cursor.execute("""
-            SELECT sp.time_spent, sp.completed, sp.completed_at, c.total_hours
-            FROM student_progress sp
-            JOIN chapter c ON sp.chapter_id = c.id
-            WHERE sp.student_id = ? AND sp.course_id = ?
-        """, (student_id, course_id))
-        
-        progress_data = cursor.fetchall()
-        conn.close()
-        
-        if not progress_data:
+        params = {'student_id': student_id, 'course_id': course_id}
+        with self.get_connection() as conn:
+            summary = conn.execute(SPEED_SQL, params).fetchone()
+        if summary is None:
+            self._build_summaries([student_id], course_id)
+            with self.engine.connect() as conn:
+                summary = conn.execute(SPEED_SQL, params).fetchone()
+        
+        return self._classify_speed(*summary)
+    
+    def _build_summaries(self, student_ids, course_id):
+        """Create summary rows that predate course_progress_summary"""
+        with self.engine.begin() as conn:
+            execute = lambda sql, params: conn.execute(text(sql), params)
+            for student_id in student_ids:
+                rebuild_summary(execute, student_id, course_id)
+    
+    def _classify_speed(self, progress_rows, completed_chapters, total_time):
+        """Classify learning speed from a student's progress aggregates"""
+        if not progress_rows:
             return "normal"  # Default speed
         
-        total_time = sum(row[0] for row in progress_data if row[0])
-        completed_chapters = sum(1 for row in progress_data if row[1])
-        total_chapters = len(progress_data)
-        
-        if total_chapters == 0:
-            return "normal"
-        
-        completion_rate = completed_chapters / total_chapters
+        completed_chapters = completed_chapters or 0
+        completion_rate = completed_chapters / progress_rows
         
         # Calculate average time per chapter
-        avg_time_per_chapter = total_time / completed_chapters if completed_chapters > 0 else 0
+        avg_time_per_chapter = (total_time or 0) / completed_chapters if completed_chapters > 0 else 0
         
         # Determine learning speed
         if completion_rate > 0.8 and avg_time_per_chapter < 1.5:
@@ -58,27 +150,14 @@ class AILearningTracker:
         """Get recommended content based on learning pattern"""
         learning_speed = self.calculate_learning_speed(student_id, course_id)
         
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        # Get current chapter
-        cursor.execute("""
-            SELECT content, checkpoint
-            FROM chapter
-            WHERE id = ?
-        """, (chapter_id,))
-        
-        chapter = cursor.fetchone()
-        
-        # Get student progress on this chapter
-        cursor.execute("""
-            SELECT completed, time_spent
-            FROM student_progress
-            WHERE student_id = ? AND chapter_id = ?
-        """, (student_id, chapter_id))
-        
-        progress = cursor.fetchone()
-        conn.close()
+        with self.get_connection() as conn:
+            # Get current chapter
+            chapter = conn.execute(CHAPTER_SQL, {'chapter_id': chapter_id}).fetchone()
+            
+            # Get student progress on this chapter
+            progress = conn.execute(
+                CHAPTER_PROGRESS_SQL, {'student_id': student_id, 'chapter_id': chapter_id}
+            ).fetchone()
         
         recommendations = {
             "learning_speed": learning_speed,
@@ -108,53 +187,16 @@ class AILearningTracker:
     
     def track_chapter_interaction(self, student_id, chapter_id, time_spent):
         """Track how much time student spends on a chapter"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        # Update or create progress record
-        cursor.execute("""
-            SELECT id FROM student_progress
-            WHERE student_id = ? AND chapter_id = ?
-        """, (student_id, chapter_id))
-        
-        existing = cursor.fetchone()
-        
-        if existing:
-            cursor.execute("""
-                UPDATE student_progress
-                SET time_spent = time_spent + ?
-                WHERE id = ?
-            """, (time_spent / 3600, existing[0]))  # Convert seconds to hours
-        else:
-            # Get course_id from chapter
-            cursor.execute("SELECT course_id FROM chapter WHERE id = ?", (chapter_id,))
-            course_id = cursor.fetchone()[0]
-            
-            cursor.execute("""
-                INSERT INTO student_progress (student_id, course_id, chapter_id, time_spent)
-                VALUES (?, ?, ?, ?)
-            """, (student_id, course_id, chapter_id, time_spent / 3600))
-        
-        conn.commit()
-        conn.close()
+        with self.engine.begin() as conn:
+            # Same single-statement write path the Flask app uses
+            add_time_spent(lambda sql, params: conn.execute(text(sql), params),
+                           {(student_id, chapter_id): time_spent / 3600})  # Convert seconds to hours
     
     def get_next_chapter_recommendation(self, student_id, course_id):
         """Recommend next chapter based on learning pattern"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        # Get all chapters and their completion status
-        cursor.execute("""
-            SELECT c.id, c.chapter_number, c.title,
-                   CASE WHEN sp.completed = 1 THEN 1 ELSE 0 END as completed
-            FROM chapter c
-            LEFT JOIN student_progress sp ON c.id = sp.chapter_id AND sp.student_id = ?
-            WHERE c.course_id = ?
-            ORDER BY c.chapter_number
-        """, (student_id, course_id))
-        
-        chapters = cursor.fetchall()
-        conn.close()
+        with self.get_connection() as conn:
+            # Get all chapters and their completion status
+            chapters = conn.execute(NEXT_CHAPTER_SQL, {'student_id': student_id, 'course_id': course_id}).fetchall()
         
         # Find first incomplete chapter
         for chapter in chapters:
@@ -173,42 +215,55 @@ class AILearningTracker:
     
     def generate_learning_report(self, student_id, course_id):
         """Generate a learning analytics report"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        # Get course details
-        cursor.execute("SELECT title, total_chapters, total_hours FROM course WHERE id = ?", (course_id,))
-        course = cursor.fetchone()
-        
-        # Get progress statistics
-        cursor.execute("""
-            SELECT 
-                COUNT(*) as total_chapters,
-                SUM(CASE WHEN sp.completed = 1 THEN 1 ELSE 0 END) as completed_chapters,
-                SUM(sp.time_spent) as total_time_spent,
-                AVG(sp.time_spent) as avg_time_per_chapter
-            FROM chapter c
-            LEFT JOIN student_progress sp ON c.id = sp.chapter_id AND sp.student_id = ?
-            WHERE c.course_id = ?
-        """, (student_id, course_id))
-        
-        stats = cursor.fetchone()
-        conn.close()
-        
-        if not stats or not stats[0]:
-            return None
+        params = {'student_id': student_id, 'course_id': course_id}
+        with self.get_connection() as conn:
+            row = conn.execute(REPORT_SQL, params).fetchone()
         
-        total_chapters, completed_chapters, total_time, avg_time = stats
+        if not row:
+            return None
+        if row[-1] is None:
+            self._build_summaries([student_id], course_id)
+            with self.engine.connect() as conn:
+                row = conn.execute(REPORT_SQL, params).fetchone()
+        return self._build_report(*row[:-1])
+    
+    def generate_course_reports(self, course_id, student_ids=None):
+        """Learning reports for approved students of a course (all, or just `student_ids`), keyed by student id"""
+        if student_ids is not None and not student_ids:
+            return {}
+        sql, params = COURSE_REPORTS_SQL, {'course_id': course_id}
+        if student_ids is not None:
+            sql, params = COURSE_REPORTS_FOR_SQL, {'course_id': course_id, 'student_ids': list(student_ids)}
+        with self.get_connection() as conn:
+            rows = conn.execute(sql, params).fetchall()
+        
+        missing = [row[0] for row in rows if row[-1] is None]
+        if missing:
+            self._build_summaries(missing, course_id)
+            with self.engine.connect() as conn:
+                rows = conn.execute(sql, params).fetchall()
+        
+        reports = {}
+        for student_id, *stats in rows:
+            report = self._build_report(*stats[:-1])
+            if report:
+                reports[student_id] = report
+        return reports
+    
+    def _build_report(self, course_title, total_chapters, progress_rows, completed_chapters, total_time, avg_time):
+        if not total_chapters:
+            return None
         
+        completed_chapters = completed_chapters or 0
         completion_percentage = (completed_chapters / total_chapters * 100) if total_chapters > 0 else 0
         estimated_remaining_time = (total_chapters - completed_chapters) * (avg_time or 2.0)
         
-        learning_speed = self.calculate_learning_speed(student_id, course_id)
+        learning_speed = self._classify_speed(progress_rows, completed_chapters, total_time)
         
         return {
-            "course_title": course[0],
+            "course_title": course_title,
             "total_chapters": total_chapters,
-            "completed_chapters": completed_chapters or 0,
+            "completed_chapters": completed_chapters,
             "completion_percentage": round(completion_percentage, 1),
             "total_time_spent": round(total_time or 0, 2),
             "avg_time_per_chapter": round(avg_time or 0, 2),
@@ -247,3 +302,8 @@ def get_learning_report(student_id, course_id):
     tracker = AILearningTracker()
     return tracker.generate_learning_report(student_id, course_id)
 
+def get_course_learning_reports(course_id):
+    """Get learning analytics reports for all students of a course"""
+    tracker = AILearningTracker()
+    return tracker.generate_course_reports(course_id)
+
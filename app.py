@@ -1,38 +1,85 @@
-from flask import Flask, render_template, request, redirect, url_for, session, jsonify, flash
+from flask import (Flask, render_template, request, redirect, url_for, session, jsonify, flash, g, current_app,
+                   Response, send_file)
+from flask.cli import with_appcontext
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.exc import IntegrityError
 from flask_mail import Mail, Message
 from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.utils import secure_filename
+import click
+import functools
 import secrets
+import threading
 import datetime
+import time
 import os
-from threading import Timer, Thread
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from ai_learning_tracker import AILearningTracker
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import A4
-from reportlab.lib.utils import ImageReader
-from io import BytesIO
-
-app = Flask(__name__)
-app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'your-secret-key-change-in-production')
-
-# Ensure instance folder for sqlite exists
-os.makedirs(os.path.join(app.root_path, 'instance'), exist_ok=True)
-
-# Database URL with default to instance sqlite file
-default_sqlite_path = os.path.join(app.root_path, 'instance', 'coursehub.db')
-app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', f'sqlite:///{default_sqlite_path}')
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config['MAIL_SERVER'] = 'smtp.gmail.com'
-app.config['MAIL_PORT'] = 587
-app.config['MAIL_USE_TLS'] = True
-app.config['MAIL_USERNAME'] = os.environ.get('MAIL_USERNAME', 'yourusername@gmail.com')
-app.config['MAIL_PASSWORD'] = os.environ.get('MAIL_PASSWORD', 'password1234')
-
-db = SQLAlchemy(app)
-mail = Mail(app)
+from approval_cache import ApprovalCache
+from approval_service import APPROVE_DUE_SQL, APPROVE_JOB, approve_due_batch, approve_enrollments
+from certificates import (CERTIFICATE_JOB, CertificateCache, CertificateRenderer, course_certificate_jobs,
+                          zip_certificates)
+from catalog_cache import CatalogCache, bump_version, create_store as create_catalog_store
+from chapter_cache import ChapterCache, neighbours
+from chat_bus import create_bus
+from db_routing import (REPLICA_BIND, RoutingSession, copy_sqlite, read_primary, reading_replica, remember_writes,
+                        replica_reads, stats as routing_stats)
+from http_cache import conditional, stats as conditional_stats
+from enrollment_rollup import dashboard_series, rebuild as rebuild_enrollment_rollup, record_enrollment, record_status_change
+from notification_service import (COMPACT_JOB, compact_notifications, inbox_state, mark_all_read, mark_read,
+                                  notify, rebuild as rebuild_notification_inbox)
+from progress_buffer import ProgressBuffer
+from progress_service import add_time_spent, complete_chapter, rebuild_summary, refresh_course_completion
+from scheduler import CANCEL_SQL as CANCEL_JOB_SQL, Scheduler, job_status, schedule_once
+from schema import check_query_plans, upgrade_schema
+from sqlite_tuning import run_with_retry, tune_sqlite
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Extensions are bound to an app in create_app(); importing this module
+# touches no database and starts no threads. db.session reads from the
+# replica (DATABASE_REPLICA_URL) inside views marked with @replica_reads.
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+mail = Mail()
+
+# Routes are collected here and added to every app create_app() builds
+_routes = []
+
+def route(rule, **options):
+    def decorator(view):
+        _routes.append((rule, options, view))
+        return view
+    return decorator
+
+# Services that own threads, pools or files are kept per app in app.extensions
+# and built the first time one of its requests or commands needs them
+_services_lock = threading.RLock()
+
+def app_service(name, build):
+    """current_app's `name` service, created by build(app) on first use"""
+    app = current_app._get_current_object()
+    with _services_lock:
+        service = app.extensions.get(name)
+        if service is None:
+            service = app.extensions[name] = build(app)
+        return service
+
+# Pub/sub bus used to wake long-polling chat clients (memory or sqlite backend)
+def get_chat_bus():
+    return app_service('coursehub.chat_bus', lambda app: create_bus())
+
+CHAT_WAIT_TIMEOUT = float(os.environ.get('CHAT_WAIT_TIMEOUT', 25))
+
+# A waiting long-poll holds a worker thread, so at most this many wait per
+# process (keep it below Gunicorn's --threads); the rest are answered at once
+# and told to poll again after CHAT_RETRY_AFTER seconds
+CHAT_MAX_WAITERS = int(os.environ.get('CHAT_MAX_WAITERS', 24))
+CHAT_RETRY_AFTER = float(os.environ.get('CHAT_RETRY_AFTER', 5))
+_chat_waiters = threading.BoundedSemaphore(CHAT_MAX_WAITERS)
+_chat_stats = {'waiting': 0, 'turned_away': 0}
+_chat_stats_lock = threading.Lock()
 
 # Database Models
 class User(db.Model):
@@ -74,6 +121,8 @@ class Chapter(db.Model):
     content = db.Column(db.Text)
     checkpoint = db.Column(db.String(200))
     created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
+    __table_args__ = (db.Index('ix_chapter_course_number', 'course_id', 'chapter_number'),)
 
 class Enrollment(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -82,6 +131,11 @@ class Enrollment(db.Model):
     status = db.Column(db.String(20), default='pending')  # pending, approved, rejected
     enrolled_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
     approved_at = db.Column(db.DateTime, nullable=True)
+    __table_args__ = (
+        db.Index('uq_enrollment_student_course', 'student_id', 'course_id', unique=True),
+        db.Index('ix_enrollment_status_enrolled', 'status', 'enrolled_at'),
+        db.Index('ix_enrollment_course_status', 'course_id', 'status'),
+    )
 
 class StudentProgress(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -91,6 +145,20 @@ class StudentProgress(db.Model):
     completed = db.Column(db.Boolean, default=False)
     completed_at = db.Column(db.DateTime, nullable=True)
     time_spent = db.Column(db.Float, default=0)  # in hours
+    __table_args__ = (
+        db.Index('uq_student_progress_student_chapter', 'student_id', 'chapter_id', unique=True),
+        db.Index('ix_student_progress_student_course', 'student_id', 'course_id', 'completed'),
+    )
+
+class CourseProgressSummary(db.Model):
+    # Per (student, course) rollup maintained by progress_service on every progress write
+    student_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    course_id = db.Column(db.Integer, db.ForeignKey('course.id'), primary_key=True)
+    started_count = db.Column(db.Integer, default=0)
+    completed_count = db.Column(db.Integer, default=0)
+    total_time = db.Column(db.Float, default=0)  # in hours
+    last_activity = db.Column(db.DateTime, nullable=True)
+    all_completed = db.Column(db.Boolean, default=False)
 
 class OTPSession(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -106,6 +174,53 @@ class Notification(db.Model):
     type = db.Column(db.String(20), default='info')  # info, success, warning, error
     read = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+    __table_args__ = (
+        db.Index('ix_notification_user_read', 'user_id', 'read', 'created_at'),
+        db.Index('ix_notification_user_id', 'user_id', 'id'),
+    )
+
+class NotificationInbox(db.Model):
+    # Per-user unread count kept by notification_service; ids <= read_through count as read
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    unread = db.Column(db.Integer, default=0)
+    read_through = db.Column(db.Integer, default=0)
+
+class NotificationArchive(db.Model):
+    # Read notifications past retention, moved out of the hot table by the compaction job
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    message = db.Column(db.Text, nullable=False)
+    type = db.Column(db.String(20), default='info')
+    created_at = db.Column(db.DateTime)
+    archived_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+    __table_args__ = (db.Index('ix_notification_archive_user', 'user_id', 'id'),)
+
+class EnrollmentRollup(db.Model):
+    # Enrollment counts per (month of enrolled_at, course, status), kept current by enrollment_rollup.py
+    month = db.Column(db.String(7), primary_key=True)  # YYYY-MM
+    course_id = db.Column(db.Integer, db.ForeignKey('course.id'), primary_key=True)
+    status = db.Column(db.String(20), primary_key=True)
+    count = db.Column(db.Integer, default=0)
+
+class CacheVersion(db.Model):
+    # Bumped with every change to what a cache holds, so all workers drop their copies (see catalog_cache.py)
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.BigInteger, nullable=False, default=0)
+
+class ScheduledJob(db.Model):
+    # Delay queue rows claimed and run by scheduler.Scheduler; times are unix timestamps
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    ref_id = db.Column(db.Integer, nullable=False)
+    run_at = db.Column(db.Float, nullable=False)
+    status = db.Column(db.String(20), default='pending')  # pending, running, failed
+    claimed_by = db.Column(db.String(100), nullable=True)
+    claimed_at = db.Column(db.Float, nullable=True)
+    attempts = db.Column(db.Integer, default=0)
+    __table_args__ = (
+        db.Index('ix_scheduled_job_due', 'status', 'run_at'),
+        db.Index('ix_scheduled_job_ref_status', 'kind', 'ref_id', 'status'),
+    )
 
 class ChatMessage(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -114,19 +229,37 @@ class ChatMessage(db.Model):
     sender = db.Column(db.String(10), nullable=False)  # 'student' or 'admin'
     message = db.Column(db.Text, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+    is_broadcast = False
+    # Threads are paged by id, so the index orders by id rather than created_at
+    __table_args__ = (db.Index('ix_chat_message_student', 'student_id', 'id'),)
+
+class BroadcastMessage(db.Model):
+    # One shared row per admin broadcast, merged into student threads at read time
+    id = db.Column(db.Integer, primary_key=True)
+    admin_id = db.Column(db.Integer, db.ForeignKey('admin.id'), nullable=True)
+    message = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+    sender = 'admin'
+    is_broadcast = True
+
+class BroadcastReceipt(db.Model):
+    # Per-student watermark over the broadcast stream
+    student_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    delivered_id = db.Column(db.Integer, default=0)
+    read_id = db.Column(db.Integer, default=0)
 
 # Email sending function
 def send_email(to_email, subject, body):
     try:
         msg = MIMEMultipart()
-        msg['From'] = app.config['MAIL_USERNAME']
+        msg['From'] = current_app.config['MAIL_USERNAME']
         msg['To'] = to_email
         msg['Subject'] = subject
         msg.attach(MIMEText(body, 'html'))
         
-        server = smtplib.SMTP(app.config['MAIL_SERVER'], app.config['MAIL_PORT'])
+        server = smtplib.SMTP(current_app.config['MAIL_SERVER'], current_app.config['MAIL_PORT'])
         server.starttls()
-        server.login(app.config['MAIL_USERNAME'], app.config['MAIL_PASSWORD'])
+        server.login(current_app.config['MAIL_USERNAME'], current_app.config['MAIL_PASSWORD'])
         server.send_message(msg)
         server.quit()
         return True
@@ -134,95 +267,569 @@ def send_email(to_email, subject, body):
         print(f"Email error: {e}")
         return False
 
-# Auto-approval bot function
-enrollment_timers = {}
+# Chat push helpers
+def publish_chat(message_id, student_id):
+    chat_bus = get_chat_bus()
+    chat_bus.publish('all', message_id)
+    chat_bus.publish(f'student:{student_id}', message_id)
+
+def newest_chat_id(channel):
+    """Newest id on a bus channel, read from the database"""
+    if channel == 'broadcast':
+        return db.session.query(db.func.max(BroadcastMessage.id)).scalar() or 0
+    query = db.session.query(db.func.max(ChatMessage.id))
+    if channel.startswith('student:'):
+        query = query.filter(ChatMessage.student_id == int(channel.split(':', 1)[1]))
+    return query.scalar() or 0
+
+def wait_for_chat(cursors):
+    """Long-poll the chat bus; returns {channel: newest id}, empty on timeout.
+
+    When CHAT_MAX_WAITERS requests are already waiting it returns at once
+    and page_chat adds a `retry_after` hint to the reply.
+    """
+    if not _chat_waiters.acquire(blocking=False):
+        g.chat_turned_away = True
+        with _chat_stats_lock:
+            _chat_stats['turned_away'] += 1
+        return {}
+    try:
+        with _chat_stats_lock:
+            _chat_stats['waiting'] += 1
+        chat_bus = get_chat_bus()
+        # Seed unknown channels once per process so we never wait on stale state
+        for channel in cursors:
+            if not chat_bus.knows(channel):
+                chat_bus.prime(channel, newest_chat_id(channel))
+        # Hand the DB connection back to the pool while we block
+        db.session.close()
+        return chat_bus.wait(cursors, CHAT_WAIT_TIMEOUT) or {}
+    finally:
+        with _chat_stats_lock:
+            _chat_stats['waiting'] -= 1
+        _chat_waiters.release()
+
+def broadcasts_for(student_id):
+    """Broadcasts a student should see: those sent after their account existed"""
+    joined = db.session.query(User.created_at).filter(User.id == student_id).scalar_subquery()
+    return BroadcastMessage.query.filter(BroadcastMessage.created_at >= joined)
+
+def student_thread(student_id):
+    messages = ChatMessage.query.filter_by(student_id=student_id).all()
+    return sorted(messages + broadcasts_for(student_id).all(), key=lambda m: (m.created_at, m.id))
+
+def mark_broadcasts(student_id, delivered_id=0, read_id=0):
+    """Advance a student's broadcast delivery/read watermark"""
+    read_primary()
+    receipt = BroadcastReceipt.query.get(student_id)
+    if not receipt:
+        receipt = BroadcastReceipt(student_id=student_id, delivered_id=0, read_id=0)
+        db.session.add(receipt)
+    receipt.delivered_id = max(receipt.delivered_id or 0, delivered_id, read_id)
+    receipt.read_id = max(receipt.read_id or 0, read_id)
+    db.session.commit()
 
-def auto_approve_enrollment(enrollment_id):
-    enrollment = Enrollment.query.get(enrollment_id)
-    if enrollment and enrollment.status == 'pending':
-        enrollment.status = 'approved'
-        enrollment.approved_at = datetime.datetime.utcnow()
+CHAT_PAGE_SIZE = 200
+CHAT_PAGE_MAX = 1000
+
+def student_messages(student_id):
+    """(ChatMessage, sender name) rows of one student's thread"""
+    return db.session.query(ChatMessage, User.name).outerjoin(User, User.id == ChatMessage.student_id) \
+        .filter(ChatMessage.student_id == student_id)
+
+def chat_page_query(query, id_column, after_id, before_id, limit, forward):
+    """`limit` + 1 rows of `query` after/before the cursors, in the direction being paged"""
+    if after_id:
+        query = query.filter(id_column > after_id)
+    if before_id:
+        query = query.filter(id_column < before_id)
+    return query.order_by(id_column if forward else id_column.desc()).limit(limit + 1)
+
+def page_chat_rows(query, id_column, after_id, before_id, limit, forward):
+    """Page one id-ordered query; returns (rows, has_more) oldest first"""
+    rows = chat_page_query(query, id_column, after_id, before_id, limit, forward).all()
+    if forward:
+        return rows[:limit], len(rows) > limit
+    return list(reversed(rows[:limit])), len(rows) > limit
+
+def page_chat(message_query, broadcast_query=None, woke=None):
+    """Page (ChatMessage, name) rows merged by time with shared broadcasts.
+
+    Cursors come from the after_id/after_broadcast_id, before_id/before_broadcast_id
+    and limit query args. With an after cursor the page grows forwards, otherwise
+    it is the newest `limit` items (before the before cursors, if given).
+    Returns (items, cursors) where items are (message, sender_name) oldest first.
+    """
+    woke = woke or {}
+    after_id = request.args.get('after_id', 0, type=int)
+    after_bid = request.args.get('after_broadcast_id', 0, type=int)
+    before_id = request.args.get('before_id', type=int)
+    before_bid = request.args.get('before_broadcast_id', type=int)
+    limit = max(1, min(request.args.get('limit', CHAT_PAGE_SIZE, type=int), CHAT_PAGE_MAX))
+    forward = bool(after_id or after_bid) and not (before_id or before_bid)
+
+    rows, has_more = page_chat_rows(message_query, ChatMessage.id, after_id, before_id, limit, forward)
+    fetched_ids = [m.id for m, _ in rows]
+    fetched_bids = []
+    items = [(m, name) for m, name in rows]
+    if broadcast_query is not None:
+        broadcasts, more = page_chat_rows(broadcast_query, BroadcastMessage.id, after_bid, before_bid, limit, forward)
+        has_more = has_more or more
+        fetched_bids = [b.id for b in broadcasts]
+        items += [(b, None) for b in broadcasts]
+    items.sort(key=lambda item: (item[0].created_at, item[0].id))
+    if len(items) > limit:
+        has_more = True
+        items = items[:limit] if forward else items[-limit:]
+
+    ids = [m.id for m, _ in items if not m.is_broadcast]
+    bids = [m.id for m, _ in items if m.is_broadcast]
+    if forward and has_more:
+        # Only advance past what was actually returned
+        last_id = max(ids + [after_id])
+        last_bid = max(bids + [after_bid])
+    else:
+        last_id = max(fetched_ids + [after_id, woke.get('id', 0)])
+        last_bid = max(fetched_bids + [after_bid, woke.get('broadcast_id', 0)])
+    cursors = {
+        'last_id': last_id,
+        'last_broadcast_id': last_bid,
+        'first_id': min(ids) if ids else before_id,
+        'first_broadcast_id': min(bids) if bids else before_bid,
+        'has_more': has_more,
+    }
+    if g.get('chat_turned_away'):
+        cursors['retry_after'] = CHAT_RETRY_AFTER
+    return items, cursors
+
+# Admin list pages: keyset pagination on id, with the filters carried in the page links
+ADMIN_PAGE_SIZE = 50
+ADMIN_PAGE_MAX = 500
+ENROLLMENT_STATUSES = ('pending', 'approved', 'rejected')
+
+def page_url(**changes):
+    """The current page's URL with some query args replaced (None drops an arg)"""
+    args = request.args.to_dict()
+    args.update(changes)
+    args = {key: value for key, value in args.items() if value not in (None, '')}
+    return url_for(request.endpoint, **(request.view_args or {}), **args)
+
+def keyset_page(query, id_column, descending=False):
+    """One page of `query` past the `after` cursor, ordered by `id_column`.
+
+    Returns (rows, pager); pager has next_url (None on the last page) and
+    first_url (None on the first page) for templates/_pagination.html.
+    """
+    after = request.args.get('after', type=int)
+    limit = max(1, min(request.args.get('limit', ADMIN_PAGE_SIZE, type=int), ADMIN_PAGE_MAX))
+    if after:
+        query = query.filter(id_column < after if descending else id_column > after)
+    rows = query.order_by(id_column.desc() if descending else id_column).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    pager = {
+        'next_url': page_url(after=rows[-1].id) if has_more else None,
+        'first_url': page_url(after=None) if after else None,
+    }
+    return rows, pager
+
+def parse_date(value):
+    """YYYY-MM-DD filter value as a datetime, or None if missing/invalid"""
+    try:
+        return datetime.datetime.strptime(value, '%Y-%m-%d') if value else None
+    except ValueError:
+        return None
+
+def student_search(q):
+    """Case-insensitive match on a student's name, USN or email"""
+    like = f'%{q}%'
+    return db.or_(User.name.ilike(like), User.usn.ilike(like), User.email.ilike(like))
+
+# Progress ingestion: heartbeats are coalesced and written in batches
+def db_execute(sql, params):
+    """Run raw SQL with named params on the request session (progress_service callback)"""
+    return db.session.execute(db.text(sql), params)
+
+def flush_progress(app, deltas):
+    """Apply buffered {(student_id, chapter_id): hours} deltas to `app`'s database in one transaction"""
+    def write():
+        add_time_spent(db_execute, deltas)
         db.session.commit()
-        
-        # Create notification instead of sending email
-        student = User.query.get(enrollment.student_id)
-        course = Course.query.get(enrollment.course_id)
-        notification = Notification(
-            user_id=student.id,
-            message=f"Your enrollment for {course.title} has been approved! You can now start learning.",
-            type='success'
-        )
-        db.session.add(notification)
+    with app.app_context():
+        run_with_retry(write, rollback=db.session.rollback)
+
+def retry_busy(view):
+    """Re-run a write view from the top if SQLite stays locked past its busy timeout"""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        return run_with_retry(lambda: view(*args, **kwargs), rollback=db.session.rollback)
+    return wrapper
+
+def completed_chapters_query(student_id, course_id):
+    return db.session.query(StudentProgress.chapter_id).filter_by(
+        student_id=student_id, course_id=course_id, completed=True
+    )
+
+def get_progress_summary(student_id, course_id):
+    """O(1) course progress for a student; rows missing from older databases are rebuilt once"""
+    summary = CourseProgressSummary.query.get((student_id, course_id))
+    if summary is None:
+        rebuild_summary(db_execute, student_id, course_id)
         db.session.commit()
+        summary = CourseProgressSummary.query.get((student_id, course_id))
+    return summary
+
+def current_user():
+    """The logged-in student, loaded at most once per request (as g.user)"""
+    if 'user' not in g:
+        g.user = User.query.get(session['user_id']) if 'user_id' in session else None
+    return g.user
+
+def current_admin():
+    """The logged-in admin, loaded at most once per request (as g.admin)"""
+    if 'admin' not in g:
+        g.admin = Admin.query.get(session['admin_id']) if 'admin_id' in session else None
+    return g.admin
+
+# Approved (student, course) pairs; "not approved" is never cached, so an approval
+# made anywhere shows up at once, and a rejection elsewhere within the TTL
+approval_cache = ApprovalCache(
+    ttl=float(os.environ.get('APPROVAL_CACHE_TTL', 30)),
+    max_entries=int(os.environ.get('APPROVAL_CACHE_ENTRIES', 100000))
+)
+
+def approved_enrollment_query(student_id, course_id):
+    return db.session.query(Enrollment.id).filter_by(student_id=student_id, course_id=course_id, status='approved')
+
+def enrollment_approved(student_id, course_id):
+    def load():
+        query = approved_enrollment_query(student_id, course_id)
+        if query.first():
+            return True
+        if reading_replica():
+            # The replica may not have the approval yet; ask the primary
+            read_primary()
+            return query.first() is not None
+        return False
+    return approval_cache.approved(student_id, course_id, load)
+
+def unread_notifications(user_id, read_through):
+    """Unread notifications of a user, newest first"""
+    return Notification.query.filter(
+        Notification.user_id == user_id, Notification.read == False, Notification.id > read_through
+    ).order_by(Notification.id.desc())
+
+def user_notifications(user_id):
+    """All notifications of a user, newest first"""
+    return Notification.query.filter_by(user_id=user_id).order_by(Notification.id.desc())
+
+# Chapter pages: rendered content and prev/next navigation served from memory
+chapter_cache = ChapterCache(
+    max_chars=int(os.environ.get('CHAPTER_CACHE_CHARS', 32 * 1024 * 1024))
+)
+
+# Course list and the anonymous landing page, rebuilt when an admin changes a
+# course; CATALOG_CACHE_BACKEND=sqlite shares them between workers
+catalog_cache = CatalogCache(
+    store=create_catalog_store(),
+    version_ttl=float(os.environ.get('CATALOG_VERSION_TTL', 1))
+)
+
+def chapter_index_query(course_id):
+    return db.session.query(Chapter.id, Chapter.chapter_number, Chapter.title).filter_by(
+        course_id=course_id).order_by(Chapter.chapter_number)
+
+def chapter_nav(course_id):
+    """(id, chapter_number, title) for every chapter of a course, in order"""
+    # Chapter changes bump the catalog version, so other workers rebuild too
+    return chapter_cache.nav(course_id, catalog_cache.version(db_execute),
+                             lambda: chapter_index_query(course_id).all())
+
+# Finished certificates, content-addressed on disk with LRU eviction
+certificate_cache = CertificateCache(
+    os.environ.get('CERTIFICATE_CACHE_DIR', os.path.join(BASE_DIR, 'instance', 'certificates')),
+    max_bytes=int(os.environ.get('CERTIFICATE_CACHE_BYTES', 256 * 1024 * 1024))
+)
+
+# Certificates are rendered by CERTIFICATE_JOB on the scheduler's process pool, which
+# is built only where that job runs (`flask run-scheduler`); web workers queue jobs
+# and serve what is cached, so they never hold a pool
+CERTIFICATE_WORKERS = int(os.environ.get('CERTIFICATE_WORKERS', os.cpu_count() or 1))
+def get_certificate_renderer():
+    return app_service('coursehub.certificate_renderer',
+                       lambda app: CertificateRenderer(certificate_cache, workers=CERTIFICATE_WORKERS))
+
+def certificate_completed_on(student_id, course_id):
+    """When the student finished the course: their last chapter completion"""
+    completed_at = db.session.query(db.func.max(StudentProgress.completed_at)).filter_by(
+        student_id=student_id, course_id=course_id, completed=True
+    ).scalar()
+    return completed_at or datetime.datetime.utcnow()
+
+def course_completions(course_id):
+    """(enrollment_id, student_id, name, completed_on) for every student who completed every chapter of a course"""
+    total = Chapter.query.filter_by(course_id=course_id).count()
+    if not total:
+        return []
+    rows = db.session.query(
+        Enrollment.id, StudentProgress.student_id, User.name, db.func.max(StudentProgress.completed_at)
+    ).join(User, User.id == StudentProgress.student_id).join(
+        Enrollment, db.and_(Enrollment.student_id == StudentProgress.student_id,
+                            Enrollment.course_id == StudentProgress.course_id)
+    ).filter(
+        StudentProgress.course_id == course_id, StudentProgress.completed == True
+    ).group_by(Enrollment.id, StudentProgress.student_id, User.name).having(
+        db.func.count(StudentProgress.id) >= total
+    ).order_by(StudentProgress.student_id).all()
+    now = datetime.datetime.utcnow()
+    return [(enrollment_id, student_id, name, completed_at or now)
+            for enrollment_id, student_id, name, completed_at in rows]
+
+def student_certificate_key(user, course):
+    return certificate_cache.key(user.id, course.id, user.name, course.title,
+                                 certificate_completed_on(user.id, course.id))
+
+def queue_certificate(enrollment_id, status=None):
+    """Queue a render unless one is pending or running; `status` is the job's, if already read"""
+    if status not in ('pending', 'running'):
+        schedule_once(db_execute, CERTIFICATE_JOB, enrollment_id, time.time())
+        return True
+    return False
 
-def background_auto_approver_loop():
-    from time import sleep
-    # Ensure DB ops run inside app context when started by a thread/gunicorn
+def render_certificates_job(app, execute, enrollment_ids):
+    """Scheduler handler: render the enrollments' certificates into the cache on this process's pool"""
     with app.app_context():
-        while True:
-            try:
-                cutoff = datetime.datetime.utcnow() - datetime.timedelta(minutes=5)
-                pending = Enrollment.query.filter(Enrollment.status == 'pending', Enrollment.enrolled_at <= cutoff).all()
-                for enrollment in pending:
-                    enrollment.status = 'approved'
-                    enrollment.approved_at = datetime.datetime.utcnow()
-                    db.session.add(enrollment)
-                    # notify
-                    student = User.query.get(enrollment.student_id)
-                    course = Course.query.get(enrollment.course_id)
-                    if student and course:
-                        note = Notification(
-                            user_id=student.id,
-                            message=f"Your enrollment for {course.title} has been auto-approved!",
-                            type='success'
-                        )
-                        db.session.add(note)
-                if pending:
-                    db.session.commit()
-            except Exception as e:
-                print('Auto-approver error:', e)
-                db.session.rollback()
-            finally:
-                sleep(60)
-
-# Initialize DB and seed data at import time (works for gunicorn too)
-with app.app_context():
-    db.create_all()
-    if Course.query.count() == 0:
-        courses_data = [
-            {'title': 'Java', 'description': 'Learn Java programming from basics to advanced', 'total_chapters': 10, 'total_hours': 40, 'thumbnail': 'https://cdn.jsdelivr.net/gh/devicons/devicon/icons/java/java-original.svg'},
-            {'title': 'Python', 'description': 'Master Python programming and applications', 'total_chapters': 12, 'total_hours': 50, 'thumbnail': 'https://cdn.jsdelivr.net/gh/devicons/devicon/icons/python/python-original.svg'},
-            {'title': 'C++', 'description': 'Comprehensive C++ programming course', 'total_chapters': 10, 'total_hours': 45, 'thumbnail': 'https://cdn.jsdelivr.net/gh/devicons/devicon/icons/cplusplus/cplusplus-original.svg'},
-            {'title': 'C', 'description': 'Fundamentals of C programming language', 'total_chapters': 8, 'total_hours': 35, 'thumbnail': 'https://cdn.jsdelivr.net/gh/devicons/devicon/icons/c/c-original.svg'},
-            {'title': 'Computer Networks', 'description': 'Learn networking concepts and protocols', 'total_chapters': 15, 'total_hours': 60, 'thumbnail': 'https://cdn.jsdelivr.net/gh/devicons/devicon/icons/ubuntu/ubuntu-plain.svg'},
-            {'title': 'Office Automation Tools', 'description': 'Master Microsoft Office and automation', 'total_chapters': 8, 'total_hours': 30, 'thumbnail': 'https://cdn.jsdelivr.net/gh/devicons/devicon/icons/windows8/windows8-original.svg'},
-            {'title': 'SQL', 'description': 'Database management and SQL queries', 'total_chapters': 10, 'total_hours': 40, 'thumbnail': 'https://cdn.jsdelivr.net/gh/devicons/devicon/icons/mysql/mysql-original.svg'},
-            {'title': 'Use of AI', 'description': 'Introduction to Artificial Intelligence and applications', 'total_chapters': 12, 'total_hours': 50, 'thumbnail': 'https://cdn.jsdelivr.net/gh/devicons/devicon/icons/tensorflow/tensorflow-original.svg'}
-        ]
-        for course_data in courses_data:
-            db.session.add(Course(**course_data))
+        rows = db.session.query(Enrollment.student_id, Enrollment.course_id, User.name, Course.title).join(
+            User, User.id == Enrollment.student_id
+        ).join(Course, Course.id == Enrollment.course_id).filter(Enrollment.id.in_(enrollment_ids)).all()
+        failed = get_certificate_renderer().render_all(
+            (student_id, course_id, name, title, certificate_completed_on(student_id, course_id))
+            for student_id, course_id, name, title in rows
+        )
+    if failed:
+        # The scheduler retries the batch; certificates already cached are skipped
+        raise RuntimeError(f'{len(failed)} certificates failed to render')
+
+# Pages report time every minute; a heartbeat never counts for more than this
+HEARTBEAT_MAX_SECONDS = float(os.environ.get('PROGRESS_HEARTBEAT_MAX', 300))
+
+def get_progress_buffer():
+    """This app's heartbeat buffer; it flushes into the database of the app that built it"""
+    return app_service('coursehub.progress_buffer', lambda app: ProgressBuffer(
+        functools.partial(flush_progress, app),
+        interval=float(os.environ.get('PROGRESS_FLUSH_INTERVAL', 10)),
+        max_events=int(os.environ.get('PROGRESS_FLUSH_EVENTS', 500))
+    ))
+
+# AI tracker shares the app's engine (and its connection pool); a second one
+# reads from the replica for @replica_reads views
+def get_learning_tracker():
+    if not reading_replica():
+        return app_service('coursehub.learning_tracker', lambda app: AILearningTracker(engine=db.engine))
+    return app_service('coursehub.replica_learning_tracker', lambda app: AILearningTracker(
+        engine=db.engine, read_engine=db.engines.get(REPLICA_BIND)))
+
+# Auto-approval: enrollments are approved by a durable delay queue (see scheduler.py)
+AUTO_APPROVE_DELAY = float(os.environ.get('AUTO_APPROVE_DELAY', 300))
+APPROVAL_BATCH_SIZE = int(os.environ.get('APPROVAL_BATCH_SIZE', 1000))
+
+def approve_overdue_enrollments():
+    """Set-based catch-up for enrollments pending longer than the delay, in committed batches"""
+    cutoff = datetime.datetime.utcnow() - datetime.timedelta(seconds=AUTO_APPROVE_DELAY)
+    total = 0
+    while True:
+        approved = approve_due_batch(db_execute, cutoff, APPROVAL_BATCH_SIZE)
         db.session.commit()
+        total += approved
+        if approved < APPROVAL_BATCH_SIZE:
+            return total
+
+def schedule_missing_approvals():
+    """Queue approval jobs for pending enrollments that have none (e.g. made before the scheduler)"""
+    approve_overdue_enrollments()
+    queued = db.session.query(ScheduledJob.ref_id).filter_by(kind=APPROVE_JOB)
+    pending = Enrollment.query.filter(Enrollment.status == 'pending', ~Enrollment.id.in_(queued)).all()
+    epoch = datetime.datetime(1970, 1, 1)
+    for enrollment in pending:
+        enrolled_at = enrollment.enrolled_at or datetime.datetime.utcnow()
+        run_at = (enrolled_at - epoch).total_seconds() + AUTO_APPROVE_DELAY
+        get_scheduler().schedule(APPROVE_JOB, enrollment.id, run_at=run_at, execute=db_execute)
+    db.session.commit()
 
-# Optionally start background approver in web process (single worker)
-if os.environ.get('ENABLE_AUTO_APPROVER', '1') == '1':
-    try:
-        t = Thread(target=background_auto_approver_loop, daemon=True)
-        t.start()
-        print('Background auto-approver started')
-    except Exception as e:
-        print('Failed to start background auto-approver:', e)
+# Notification inbox: read notifications older than the retention period are archived
+NOTIFICATION_PAGE_SIZE = 20
+NOTIFICATION_RETENTION_DAYS = float(os.environ.get('NOTIFICATION_RETENTION_DAYS', 30))
+NOTIFICATION_COMPACT_INTERVAL = float(os.environ.get('NOTIFICATION_COMPACT_INTERVAL', 3600))
+
+def compact_notifications_job(execute, ref_ids):
+    return compact_notifications(execute, ref_ids, retention_days=NOTIFICATION_RETENTION_DAYS,
+                                 batch_size=APPROVAL_BATCH_SIZE, interval=NOTIFICATION_COMPACT_INTERVAL)
+
+# Delay queue for approvals and housekeeping, built on first use
+def get_scheduler():
+    return app_service('coursehub.scheduler', lambda app: Scheduler(
+        db.engine,
+        {APPROVE_JOB: approve_enrollments, COMPACT_JOB: compact_notifications_job,
+         CERTIFICATE_JOB: functools.partial(render_certificates_job, app)},
+        batch_size=int(os.environ.get('SCHEDULER_BATCH_SIZE', 100)),
+        # Other processes queue certificates that a student is waiting for
+        refresh_interval=float(os.environ.get('SCHEDULER_REFRESH_INTERVAL', 5))
+    ))
+
+def init_db():
+    """Create tables, upgrade older schemas, backfill rollups and queue missing jobs; safe to repeat"""
+    db.create_all()
+    upgrade_schema(db.engine, db.metadata)
+    if not EnrollmentRollup.query.first() and Enrollment.query.first():
+        # Older database: build the dashboard rollup once from history
+        rebuild_enrollment_rollup(db_execute, db.engine.dialect.name)
+        db.session.commit()
+    if not NotificationInbox.query.first() and Notification.query.first():
+        # Older database: count unread notifications once
+        rebuild_notification_inbox(db_execute)
+        db.session.commit()
+    schedule_missing_approvals()
+    schedule_once(db_execute, COMPACT_JOB, 0, time.time())
+    # New deploy, maybe new templates: don't serve pages cached by the last one
+    bump_version(db_execute)
+    db.session.commit()
+    catalog_cache.expire()
+
+def seed_courses():
+    """Add the default course catalog to an empty database; returns the number added"""
+    if Course.query.count():
+        return 0
+    courses_data = [
+        {'title': 'Java', 'description': 'Learn Java programming from basics to advanced', 'total_chapters': 10, 'total_hours': 40, 'thumbnail': 'https://cdn.jsdelivr.net/gh/devicons/devicon/icons/java/java-original.svg'},
+        {'title': 'Python', 'description': 'Master Python programming and applications', 'total_chapters': 12, 'total_hours': 50, 'thumbnail': 'https://cdn.jsdelivr.net/gh/devicons/devicon/icons/python/python-original.svg'},
+        {'title': 'C++', 'description': 'Comprehensive C++ programming course', 'total_chapters': 10, 'total_hours': 45, 'thumbnail': 'https://cdn.jsdelivr.net/gh/devicons/devicon/icons/cplusplus/cplusplus-original.svg'},
+        {'title': 'C', 'description': 'Fundamentals of C programming language', 'total_chapters': 8, 'total_hours': 35, 'thumbnail': 'https://cdn.jsdelivr.net/gh/devicons/devicon/icons/c/c-original.svg'},
+        {'title': 'Computer Networks', 'description': 'Learn networking concepts and protocols', 'total_chapters': 15, 'total_hours': 60, 'thumbnail': 'https://cdn.jsdelivr.net/gh/devicons/devicon/icons/ubuntu/ubuntu-plain.svg'},
+        {'title': 'Office Automation Tools', 'description': 'Master Microsoft Office and automation', 'total_chapters': 8, 'total_hours': 30, 'thumbnail': 'https://cdn.jsdelivr.net/gh/devicons/devicon/icons/windows8/windows8-original.svg'},
+        {'title': 'SQL', 'description': 'Database management and SQL queries', 'total_chapters': 10, 'total_hours': 40, 'thumbnail': 'https://cdn.jsdelivr.net/gh/devicons/devicon/icons/mysql/mysql-original.svg'},
+        {'title': 'Use of AI', 'description': 'Introduction to Artificial Intelligence and applications', 'total_chapters': 12, 'total_hours': 50, 'thumbnail': 'https://cdn.jsdelivr.net/gh/devicons/devicon/icons/tensorflow/tensorflow-original.svg'}
+    ]
+    for course_data in courses_data:
+        db.session.add(Course(**course_data))
+    bump_version(db_execute)
+    db.session.commit()
+    catalog_cache.expire()
+    return len(courses_data)
+
+# Background jobs belong to `flask run-scheduler` or bot.py; a web process only
+# runs the scheduler when ENABLE_AUTO_APPROVER=1 (claims are atomic, so that is
+# safe alongside them). It is started by the app's first request, never at import.
+def start_background_services():
+    with _services_lock:
+        if current_app.extensions.get('coursehub.background_started'):
+            return
+        current_app.extensions['coursehub.background_started'] = True
+    if os.environ.get('ENABLE_AUTO_APPROVER', '0') == '1':
+        try:
+            get_scheduler().start()
+            print('Background scheduler started')
+        except Exception as e:
+            print('Failed to start background scheduler:', e)
+
+# Conditional GET: what each page depends on, read without rendering it (see http_cache.conditional)
+PROGRESS_STAMP_SQL = """
+    SELECT started_count, completed_count, total_time, all_completed
+    FROM course_progress_summary
+    WHERE student_id = :student_id AND course_id = :course_id
+"""
+
+CHAPTER_STAMP_SQL = """
+    SELECT ch.course_id, ch.updated_at, sp.completed, sp.time_spent
+    FROM chapter ch
+    LEFT JOIN student_progress sp ON sp.chapter_id = ch.id AND sp.student_id = :student_id
+    WHERE ch.id = :chapter_id
+"""
+
+def progress_stamp(student_id, course_id):
+    """A student's course progress counters, or None before their summary row exists"""
+    row = db_execute(PROGRESS_STAMP_SQL, {'student_id': student_id, 'course_id': course_id}).fetchone()
+    return tuple(row) if row else None
+
+def chapter_progress(student_id, chapter_id):
+    """(course_id, updated_at, completed, time_spent) of a chapter for a student, or None"""
+    return db_execute(CHAPTER_STAMP_SQL, {'student_id': student_id, 'chapter_id': chapter_id}).fetchone()
+
+def course_stamp(course_id):
+    if 'user_id' not in session or not enrollment_approved(session['user_id'], course_id):
+        return None
+    progress = progress_stamp(session['user_id'], course_id)
+    if progress is None:
+        return None
+    return (session['user_id'], progress, chapter_nav(course_id), catalog_cache.version(db_execute))
+
+def chapter_stamp(chapter_id):
+    if 'user_id' not in session:
+        return None
+    row = chapter_progress(session['user_id'], chapter_id)
+    if row is None or not enrollment_approved(session['user_id'], row.course_id):
+        return None
+    return (session['user_id'], row.updated_at, row.completed, chapter_nav(row.course_id),
+            catalog_cache.version(db_execute))
+
+def chat_history_stamp(student_id):
+    if request.args.get('wait'):
+        return None
+    if 'user_id' in session and session['user_id'] != student_id:
+        return None
+    if 'admin_id' not in session and 'user_id' not in session:
+        return None
+    if session.get('user_id') == student_id:
+        # The full response records broadcast delivery, so it may only be skipped when there is none to record
+        receipt = BroadcastReceipt.query.get(student_id)
+        delivered_id = (receipt.delivered_id or 0) if receipt else 0
+        if broadcasts_for(student_id).filter(BroadcastMessage.id > delivered_id).first():
+            return None
+    # Messages are append-only, so the newest ids identify the thread state
+    return (student_id, newest_chat_id(f'student:{student_id}'), newest_chat_id('broadcast'))
+
+def chat_history_all_stamp():
+    if request.args.get('wait') or 'admin_id' not in session:
+        return None
+    return (newest_chat_id('all'), newest_chat_id('broadcast'))
+
+def chat_history_students_stamp():
+    if request.args.get('wait') or 'admin_id' not in session:
+        return None
+    return (newest_chat_id('all'),)
+
+def recommendations_stamp(chapter_id):
+    if 'user_id' not in session:
+        return None
+    row = chapter_progress(session['user_id'], chapter_id)
+    progress = row and progress_stamp(session['user_id'], row.course_id)
+    if progress is None:
+        return None
+    return (session['user_id'], row.completed, row.time_spent, progress)
+
+def learning_report_stamp(course_id):
+    if 'user_id' not in session:
+        return None
+    progress = progress_stamp(session['user_id'], course_id)
+    if progress is None:
+        return None
+    chapters = db.session.query(db.func.count(Chapter.id)).filter_by(course_id=course_id).scalar()
+    return (session['user_id'], progress, chapters, catalog_cache.version(db_execute))
 
 # Routes
-@app.route('/')
+@route('/')
+@replica_reads
 def landing():
-    courses = Course.query.all()
-    return render_template('landing.html', courses=courses)
+    render = lambda: render_template('landing.html', courses=catalog_cache.courses(db_execute))
+    if 'user_id' in session or 'admin_id' in session or '_flashes' in session:
+        return render()
+    # Every anonymous visitor without flashed messages gets the same page
+    return catalog_cache.fragment('landing', db_execute, render)
 
-@app.route('/get-started')
+@route('/get-started')
 def get_started():
     return redirect(url_for('login'))
 
-@app.route('/login', methods=['GET', 'POST'])
+@route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
         email = request.form.get('email')
@@ -247,7 +854,8 @@ def login():
     
     return render_template('login.html')
 
-@app.route('/signup', methods=['GET', 'POST'])
+@route('/signup', methods=['GET', 'POST'])
+@retry_busy
 def signup():
     if request.method == 'POST':
         name = request.form.get('name')
@@ -285,7 +893,8 @@ def signup():
 
 # OTP verification route removed - no longer needed
 
-@app.route('/admin-signup', methods=['GET', 'POST'])
+@route('/admin-signup', methods=['GET', 'POST'])
+@retry_busy
 def admin_signup():
     if request.method == 'POST':
         full_name = request.form.get('full_name')
@@ -317,53 +926,40 @@ def admin_signup():
     
     return render_template('admin_signup.html')
 
-@app.route('/dashboard')
+@route('/dashboard')
+@replica_reads
 def dashboard():
     if 'user_id' not in session:
         return redirect(url_for('login'))
     
-    user = User.query.get(session['user_id'])
+    user = current_user()
     enrollments = Enrollment.query.filter_by(student_id=user.id).all()
-    courses = Course.query.all()
+    courses = catalog_cache.courses(db_execute)
     
     enrolled_course_ids = [e.course_id for e in enrollments if e.status == 'approved']
     available_courses = [c for c in courses if c.id not in enrolled_course_ids]
     
-    # Get unread notifications
-    notifications = Notification.query.filter_by(
-        user_id=user.id,
-        read=False
-    ).order_by(Notification.created_at.desc()).all()
+    # Newest page of unread notifications; the badge shows the full count
+    unread_count, read_through = inbox_state(db_execute, user.id)
+    notifications = unread_notifications(user.id, read_through).limit(NOTIFICATION_PAGE_SIZE).all()
     
     return render_template('dashboard.html', 
                          user=user, 
                          enrollments=enrollments,
                          available_courses=available_courses,
-                         notifications=notifications)
+                         notifications=notifications,
+                         unread_count=unread_count)
 
-@app.route('/admin-dashboard')
+@route('/admin-dashboard')
 def admin_dashboard():
     if 'admin_id' not in session:
         return redirect(url_for('login'))
     
     total_students = User.query.count()
     total_courses = Course.query.count()
-    total_enrollments = Enrollment.query.count()
-    
-    # Get monthly enrollment data
-    enrollments = Enrollment.query.all()
-    monthly_data = {}
-    for enrollment in enrollments:
-        month_key = enrollment.enrolled_at.strftime('%Y-%m')
-        monthly_data[month_key] = monthly_data.get(month_key, 0) + 1
-    
-    # Get course-wise enrollment data
-    course_data = {}
-    for enrollment in enrollments:
-        if enrollment.status == 'approved':
-            course = Course.query.get(enrollment.course_id)
-            if course:
-                course_data[course.title] = course_data.get(course.title, 0) + 1
+    
+    # Monthly and course-wise enrollment series come from the rollup, not the enrollment table
+    total_enrollments, monthly_data, course_data = dashboard_series(db_execute)
     
     courses = Course.query.all()
     
@@ -375,41 +971,43 @@ def admin_dashboard():
                          course_data=course_data,
                          courses=courses)
 
-@app.route('/profile')
+@route('/profile')
 def profile():
     if 'user_id' not in session:
         return redirect(url_for('login'))
     
-    user = User.query.get(session['user_id'])
+    user = current_user()
     enrollments = Enrollment.query.filter_by(student_id=user.id).all()
     
     return render_template('profile.html', user=user, enrollments=enrollments)
 
-@app.route('/admin-profile')
+@route('/admin-profile')
 def admin_profile():
     if 'admin_id' not in session:
         return redirect(url_for('login'))
     
-    admin = Admin.query.get(session['admin_id'])
+    admin = current_admin()
     return render_template('admin_profile.html', admin=admin)
 
-@app.route('/admin/delete-account', methods=['POST'])
+@route('/admin/delete-account', methods=['POST'])
 def admin_delete_account():
     if 'admin_id' not in session:
         return redirect(url_for('login'))
-    admin = Admin.query.get(session['admin_id'])
+    admin = current_admin()
     if not admin:
         session.clear()
         return redirect(url_for('landing'))
     # Detach admin_id from chat messages to avoid FK issues
     ChatMessage.query.filter_by(admin_id=admin.id).update({ChatMessage.admin_id: None})
+    BroadcastMessage.query.filter_by(admin_id=admin.id).update({BroadcastMessage.admin_id: None})
     db.session.delete(admin)
     db.session.commit()
     session.clear()
     flash('Your admin account has been deleted.', 'success')
     return redirect(url_for('landing'))
 
-@app.route('/enroll/<int:course_id>')
+@route('/enroll/<int:course_id>')
+@retry_busy
 def enroll(course_id):
     if 'user_id' not in session:
         return redirect(url_for('login'))
@@ -431,75 +1029,66 @@ def enroll(course_id):
         status='pending'
     )
     db.session.add(enrollment)
-    db.session.commit()
+    try:
+        db.session.flush()
+    except IntegrityError:
+        # A concurrent request enrolled first (uq_enrollment_student_course)
+        db.session.rollback()
+        flash('You are already enrolled in this course', 'info')
+        return redirect(url_for('dashboard'))
     
-    # Schedule auto-approval after 5 minutes
-    timer = Timer(300.0, auto_approve_enrollment, args=[enrollment.id])
-    timer.start()
-    enrollment_timers[enrollment.id] = timer
+    # Schedule auto-approval after 5 minutes, in the same transaction as the enrollment
+    get_scheduler().schedule(APPROVE_JOB, enrollment.id, delay=AUTO_APPROVE_DELAY, execute=db_execute)
+    record_enrollment(db_execute, enrollment.enrolled_at, enrollment.course_id)
+    db.session.commit()
     
     flash('Enrollment request submitted. You will receive an email once approved.', 'success')
     return redirect(url_for('dashboard'))
 
-@app.route('/course/<int:course_id>')
+@route('/course/<int:course_id>')
+@replica_reads
+@conditional(course_stamp)
 def view_course(course_id):
     if 'user_id' not in session:
         return redirect(url_for('login'))
     
     course = Course.query.get_or_404(course_id)
-    enrollment = Enrollment.query.filter_by(
-        student_id=session['user_id'],
-        course_id=course_id,
-        status='approved'
-    ).first()
-    
-    if not enrollment:
+    if not enrollment_approved(session['user_id'], course_id):
         flash('You must enroll and be approved to view this course', 'error')
         return redirect(url_for('dashboard'))
     
-    chapters = Chapter.query.filter_by(course_id=course_id).order_by(Chapter.chapter_number).all()
+    chapters = chapter_nav(course_id)
     
-    # Get progress
-    progress = {}
-    for chapter in chapters:
-        student_progress = StudentProgress.query.filter_by(
-            student_id=session['user_id'],
-            chapter_id=chapter.id
-        ).first()
-        progress[chapter.id] = student_progress.completed if student_progress else False
-    
-    # Determine completion
-    all_completed = all(progress.get(ch.id, False) for ch in chapters) if chapters else False
+    # Get progress: one query for the completed chapter ids, completion from the summary
+    completed_ids = {chapter_id for (chapter_id,) in completed_chapters_query(session['user_id'], course_id)}
+    progress = {chapter.id: chapter.id in completed_ids for chapter in chapters}
+    
+    all_completed = get_progress_summary(session['user_id'], course_id).all_completed
     return render_template('course_view.html', 
                          course=course, 
                          chapters=chapters,
                          progress=progress,
                          all_completed=all_completed)
 
-@app.route('/chapter/<int:chapter_id>')
+@route('/chapter/<int:chapter_id>')
+@replica_reads
+@conditional(chapter_stamp)
 def view_chapter(chapter_id):
     if 'user_id' not in session:
         return redirect(url_for('login'))
     
-    chapter = Chapter.query.get_or_404(chapter_id)
+    # The content blob is served from chapter_cache, so leave it out of the row
+    chapter = Chapter.query.options(db.defer(Chapter.content)).get_or_404(chapter_id)
     course = chapter.course
     
     # Check enrollment
-    enrollment = Enrollment.query.filter_by(
-        student_id=session['user_id'],
-        course_id=course.id,
-        status='approved'
-    ).first()
-    
-    if not enrollment:
+    if not enrollment_approved(session['user_id'], course.id):
         return redirect(url_for('dashboard'))
     
-    # Get all chapters for navigation
-    all_chapters = Chapter.query.filter_by(course_id=course.id).order_by(Chapter.chapter_number).all()
-    current_index = next((i for i, ch in enumerate(all_chapters) if ch.id == chapter.id), 0)
-    
-    prev_chapter = all_chapters[current_index - 1] if current_index > 0 else None
-    next_chapter = all_chapters[current_index + 1] if current_index < len(all_chapters) - 1 else None
+    # Navigation comes from the cached (id, number, title) index, not sibling rows
+    prev_chapter, next_chapter = neighbours(chapter_nav(course.id), chapter.id)
+    content_html = chapter_cache.content(chapter.id, chapter.updated_at, lambda: db.session.query(
+        Chapter.content).filter_by(id=chapter.id).scalar())
     
     # Get progress
     student_progress = StudentProgress.query.filter_by(
@@ -509,78 +1098,63 @@ def view_chapter(chapter_id):
     
     return render_template('chapter_view.html',
                          chapter=chapter,
+                         content_html=content_html,
                          course=course,
                          prev_chapter=prev_chapter,
                          next_chapter=next_chapter,
                          progress=student_progress)
 
-@app.route('/certificate/<int:course_id>')
+@route('/certificate/<int:course_id>')
 def certificate(course_id):
     if 'user_id' not in session:
         return redirect(url_for('login'))
-    user = User.query.get(session['user_id'])
+    user = current_user()
     course = Course.query.get_or_404(course_id)
     # Verify full completion
-    chapters = Chapter.query.filter_by(course_id=course_id).all()
-    if not chapters:
-        flash('No chapters found for this course', 'error')
-        return redirect(url_for('view_course', course_id=course_id))
-    completed_count = StudentProgress.query.filter_by(student_id=user.id, course_id=course_id, completed=True).count()
-    if completed_count < len(chapters):
-        flash('Complete all chapters to download the certificate', 'error')
+    if not get_progress_summary(user.id, course_id).all_completed:
+        if not db.session.query(Chapter.id).filter_by(course_id=course_id).first():
+            flash('No chapters found for this course', 'error')
+        else:
+            flash('Complete all chapters to download the certificate', 'error')
         return redirect(url_for('view_course', course_id=course_id))
 
-    # Generate certificate PDF in memory
-    buffer = BytesIO()
-    pdf = canvas.Canvas(buffer, pagesize=A4)
-    width, height = A4
-
-    # Try to draw a background image if available
-    import os
-    bg_path = os.path.join(app.root_path, 'static', 'img', 'certificate_bg.png')
-    try:
-        if os.path.exists(bg_path):
-            pdf.drawImage(ImageReader(bg_path), 0, 0, width=width, height=height)
-    except Exception as e:
-        print('Certificate background error:', e)
-
-    # Title
-    pdf.setFillColorRGB(0.82, 0.05, 0.05)  # accent-ish
-    pdf.setFont('Helvetica-Bold', 28)
-    pdf.drawCentredString(width/2, height-120, 'CERTIFICATE OF COMPLETION')
-
-    # Presented to
-    pdf.setFillColorRGB(1,1,1)
-    pdf.setFont('Helvetica', 14)
-    pdf.drawCentredString(width/2, height-160, f'is presented to')
-
-    # Name
-    pdf.setFillColorRGB(1,1,1)
-    pdf.setFont('Helvetica-Bold', 24)
-    pdf.drawCentredString(width/2, height-200, user.name)
-
-    # Course
-    pdf.setFont('Helvetica', 14)
-    pdf.drawCentredString(width/2, height-230, f'for successfully completing {course.title}')
-
-    # Date
-    pdf.setFont('Helvetica-Oblique', 12)
-    pdf.drawCentredString(width/2, height-260, datetime.datetime.utcnow().strftime('Dated: %d %B %Y (UTC)'))
-
-    # Seal
-    pdf.circle(width/2, 140, 28, stroke=1, fill=0)
-    pdf.setFont('Helvetica', 10)
-    pdf.drawCentredString(width/2, 120, 'CourseHub')
-
-    pdf.showPage()
-    pdf.save()
-    buffer.seek(0)
+    # Served from the disk cache; a miss is queued for the scheduler's render pool
+    key = student_certificate_key(user, course)
+    path = certificate_cache.get(key)
+    if path is None:
+        enrollment = approved_enrollment_query(user.id, course_id).first()
+        if enrollment and queue_certificate(enrollment.id, job_status(db_execute, CERTIFICATE_JOB, enrollment.id)):
+            db.session.commit()
+        return render_template('certificate_pending.html', course=course), 202
 
-    from flask import send_file
     filename = f'CourseHub-Certificate-{course.title}-{user.name}.pdf'
-    return send_file(buffer, as_attachment=True, download_name=filename, mimetype='application/pdf')
+    return send_file(path, as_attachment=True, download_name=filename, mimetype='application/pdf')
 
-@app.route('/complete-checkpoint/<int:chapter_id>', methods=['POST'])
+@route('/certificate/<int:course_id>/status')
+def certificate_status(course_id):
+    if 'user_id' not in session:
+        return jsonify({'success': False})
+    user = current_user()
+    course = Course.query.get_or_404(course_id)
+    if not get_progress_summary(user.id, course_id).all_completed:
+        return jsonify({'success': False, 'error': 'Course not completed'})
+    key = student_certificate_key(user, course)
+    if certificate_cache.exists(key):
+        status = 'ready'
+    else:
+        # Queueing again is idempotent, and retries a render that failed
+        enrollment = approved_enrollment_query(user.id, course_id).first()
+        if enrollment is None:
+            return jsonify({'success': False, 'error': 'Not enrolled'})
+        job = job_status(db_execute, CERTIFICATE_JOB, enrollment.id)
+        if queue_certificate(enrollment.id, job):
+            db.session.commit()
+        status = 'failed' if job == 'failed' else 'pending'
+    return jsonify({'success': True, 'status': status,
+                    'download_url': url_for('certificate', course_id=course_id)})
+
+@route('/complete-checkpoint/<int:chapter_id>', methods=['POST'])
+@retry_busy
 def complete_checkpoint(chapter_id):
     if 'user_id' not in session:
         return jsonify({'success': False, 'message': 'Not logged in'})
@@ -588,47 +1162,29 @@ def complete_checkpoint(chapter_id):
     chapter = Chapter.query.get_or_404(chapter_id)
     
     # Check enrollment
-    enrollment = Enrollment.query.filter_by(
-        student_id=session['user_id'],
-        course_id=chapter.course_id,
-        status='approved'
-    ).first()
-    
-    if not enrollment:
+    if not enrollment_approved(session['user_id'], chapter.course_id):
         return jsonify({'success': False, 'message': 'Not enrolled'})
     
-    # Update or create progress
-    student_progress = StudentProgress.query.filter_by(
-        student_id=session['user_id'],
-        chapter_id=chapter_id
-    ).first()
-    
-    if not student_progress:
-        student_progress = StudentProgress(
-            student_id=session['user_id'],
-            course_id=chapter.course_id,
-            chapter_id=chapter_id,
-            completed=True,
-            completed_at=datetime.datetime.utcnow()
-        )
-        db.session.add(student_progress)
-    else:
-        student_progress.completed = True
-        student_progress.completed_at = datetime.datetime.utcnow()
-    
+    # Update or create progress (and the course summary) in one transaction
+    complete_chapter(db_execute, session['user_id'], chapter_id, chapter.course_id)
     db.session.commit()
     
     return jsonify({'success': True})
 
-@app.route('/admin/courses')
+@route('/admin/courses')
 def admin_courses():
     if 'admin_id' not in session:
         return redirect(url_for('login'))
     
-    courses = Course.query.all()
-    return render_template('admin_courses.html', courses=courses)
+    query = Course.query
+    q = request.args.get('q', '').strip()
+    if q:
+        query = query.filter(Course.title.ilike(f'%{q}%'))
+    courses, pager = keyset_page(query, Course.id)
+    return render_template('admin_courses.html', courses=courses, pager=pager, q=q)
 
-@app.route('/admin/create-course', methods=['GET', 'POST'])
+@route('/admin/create-course', methods=['GET', 'POST'])
+@retry_busy
 def admin_create_course():
     if 'admin_id' not in session:
         return redirect(url_for('login'))
@@ -648,14 +1204,17 @@ def admin_create_course():
             total_hours=total_hours
         )
         db.session.add(course)
+        bump_version(db_execute)
         db.session.commit()
+        catalog_cache.expire()
         
         flash('Course created successfully', 'success')
         return redirect(url_for('admin_courses'))
     
     return render_template('admin_create_course.html')
 
-@app.route('/admin/edit-course/<int:course_id>', methods=['GET', 'POST'])
+@route('/admin/edit-course/<int:course_id>', methods=['GET', 'POST'])
+@retry_busy
 def admin_edit_course(course_id):
     if 'admin_id' not in session:
         return redirect(url_for('login'))
@@ -668,22 +1227,48 @@ def admin_edit_course(course_id):
         course.thumbnail = request.form.get('thumbnail')
         course.total_chapters = int(request.form.get('total_chapters', 0))
         course.total_hours = float(request.form.get('total_hours', 0))
+        bump_version(db_execute)
         
         db.session.commit()
+        chapter_cache.invalidate_course(course_id)
+        catalog_cache.expire()
         flash('Course updated successfully', 'success')
         return redirect(url_for('admin_courses'))
     
     return render_template('admin_edit_course.html', course=course)
 
-@app.route('/admin/enrollments')
+@route('/admin/enrollments')
 def admin_enrollments():
     if 'admin_id' not in session:
         return redirect(url_for('login'))
     
-    enrollments = Enrollment.query.order_by(Enrollment.enrolled_at.desc()).all()
-    return render_template('admin_enrollments.html', enrollments=enrollments)
-
-@app.route('/admin/enrollments/<int:enrollment_id>/approve', methods=['POST'])
+    # Newest first; student and course come in the same query instead of one lazy load per row
+    query = Enrollment.query.options(db.joinedload(Enrollment.student), db.joinedload(Enrollment.course))
+    filters = {
+        'q': request.args.get('q', '').strip(),
+        'status': request.args.get('status', ''),
+        'course_id': request.args.get('course_id', type=int),
+        'from': request.args.get('from', ''),
+        'to': request.args.get('to', ''),
+    }
+    if filters['q']:
+        query = query.filter(Enrollment.student.has(student_search(filters['q'])))
+    if filters['status'] in ENROLLMENT_STATUSES:
+        query = query.filter(Enrollment.status == filters['status'])
+    if filters['course_id']:
+        query = query.filter(Enrollment.course_id == filters['course_id'])
+    date_from, date_to = parse_date(filters['from']), parse_date(filters['to'])
+    if date_from:
+        query = query.filter(Enrollment.enrolled_at >= date_from)
+    if date_to:
+        query = query.filter(Enrollment.enrolled_at < date_to + datetime.timedelta(days=1))
+    enrollments, pager = keyset_page(query, Enrollment.id, descending=True)
+    courses = db.session.query(Course.id, Course.title).order_by(Course.title).all()
+    return render_template('admin_enrollments.html', enrollments=enrollments, pager=pager,
+                           filters=filters, courses=courses, statuses=ENROLLMENT_STATUSES)
+
+@route('/admin/enrollments/<int:enrollment_id>/approve', methods=['POST'])
+@retry_busy
 def admin_approve_enrollment(enrollment_id):
     if 'admin_id' not in session:
         return jsonify({'success': False, 'error': 'Not authorized'})
@@ -693,30 +1278,24 @@ def admin_approve_enrollment(enrollment_id):
     if enrollment.status != 'pending':
         return jsonify({'success': False, 'error': 'Enrollment already processed'})
     
-    # Cancel the auto-approval timer if it exists
-    if enrollment_id in enrollment_timers:
-        enrollment_timers[enrollment_id].cancel()
-        del enrollment_timers[enrollment_id]
+    # Cancel the pending auto-approval job
+    get_scheduler().cancel(APPROVE_JOB, enrollment_id, execute=db_execute)
     
     # Approve the enrollment
     enrollment.status = 'approved'
     enrollment.approved_at = datetime.datetime.utcnow()
-    db.session.commit()
+    record_status_change(db_execute, [(enrollment.enrolled_at, enrollment.course_id)], 'pending', 'approved')
     
-    # Create notification for student
-    student = User.query.get(enrollment.student_id)
+    # Notify the student in the same transaction
     course = Course.query.get(enrollment.course_id)
-    notification = Notification(
-        user_id=student.id,
-        message=f"Your enrollment for {course.title} has been approved by admin! You can now start learning.",
-        type='success'
-    )
-    db.session.add(notification)
+    notify(db_execute, enrollment.student_id, f"Your enrollment for {course.title} has been approved by admin! You can now start learning.", 'success')
     db.session.commit()
+    approval_cache.invalidate(enrollment.student_id, enrollment.course_id)
     
     return jsonify({'success': True, 'message': 'Enrollment approved successfully'})
 
-@app.route('/admin/enrollments/<int:enrollment_id>/reject', methods=['POST'])
+@route('/admin/enrollments/<int:enrollment_id>/reject', methods=['POST'])
+@retry_busy
 def admin_reject_enrollment(enrollment_id):
     if 'admin_id' not in session:
         return jsonify({'success': False, 'error': 'Not authorized'})
@@ -726,76 +1305,80 @@ def admin_reject_enrollment(enrollment_id):
     if enrollment.status != 'pending':
         return jsonify({'success': False, 'error': 'Enrollment already processed'})
     
-    # Cancel the auto-approval timer if it exists
-    if enrollment_id in enrollment_timers:
-        enrollment_timers[enrollment_id].cancel()
-        del enrollment_timers[enrollment_id]
+    # Cancel the pending auto-approval job
+    get_scheduler().cancel(APPROVE_JOB, enrollment_id, execute=db_execute)
     
     # Reject the enrollment
     enrollment.status = 'rejected'
-    db.session.commit()
+    record_status_change(db_execute, [(enrollment.enrolled_at, enrollment.course_id)], 'pending', 'rejected')
     
-    # Create notification for student
-    student = User.query.get(enrollment.student_id)
+    # Notify the student in the same transaction
     course = Course.query.get(enrollment.course_id)
-    notification = Notification(
-        user_id=student.id,
-        message=f"Your enrollment for {course.title} has been rejected. Please contact admin for more information.",
-        type='error'
-    )
-    db.session.add(notification)
+    notify(db_execute, enrollment.student_id, f"Your enrollment for {course.title} has been rejected. Please contact admin for more information.", 'error')
     db.session.commit()
+    approval_cache.invalidate(enrollment.student_id, enrollment.course_id)
     
     return jsonify({'success': True, 'message': 'Enrollment rejected successfully'})
 
-@app.route('/admin/students')
+@route('/admin/students')
 def admin_students():
     if 'admin_id' not in session:
         return redirect(url_for('login'))
     
-    students = User.query.all()
-    return render_template('admin_students.html', students=students)
+    query = User.query
+    q = request.args.get('q', '').strip()
+    if q:
+        query = query.filter(student_search(q))
+    students, pager = keyset_page(query, User.id)
+    return render_template('admin_students.html', students=students, pager=pager, q=q)
 
 # Chat - Student view
-@app.route('/chat')
+@route('/chat')
 def chat():
     if 'user_id' not in session:
         return redirect(url_for('login'))
     student_id = session['user_id']
-    messages = ChatMessage.query.filter_by(student_id=student_id).order_by(ChatMessage.created_at).all()
+    messages = student_thread(student_id)
+    bids = [m.id for m in messages if m.is_broadcast]
+    if bids:
+        mark_broadcasts(student_id, read_id=max(bids))
     return render_template('chat.html', messages=messages)
 
 # Chat - Admin list and per-student view
-@app.route('/admin/chats')
+@route('/admin/chats')
 def admin_chats():
     if 'admin_id' not in session:
         return redirect(url_for('login'))
-    # distinct students with messages
-    student_ids = db.session.query(ChatMessage.student_id).distinct().all()
-    students = User.query.filter(User.id.in_([sid for (sid,) in student_ids])).all()
-    return render_template('admin_chats.html', students=students)
-
-@app.route('/admin/group-chat')
+    # Students with at least one message (an indexed EXISTS per student, not a DISTINCT over all chats)
+    query = User.query.filter(db.exists().where(ChatMessage.student_id == User.id))
+    q = request.args.get('q', '').strip()
+    if q:
+        query = query.filter(student_search(q))
+    students, pager = keyset_page(query, User.id)
+    return render_template('admin_chats.html', students=students, pager=pager, q=q)
+
+@route('/admin/group-chat')
 def admin_group_chat():
     if 'admin_id' not in session:
         return redirect(url_for('login'))
     return render_template('admin_group_chat.html')
 
-@app.route('/admin/student-group-chat')
+@route('/admin/student-group-chat')
 def admin_student_group_chat():
     if 'admin_id' not in session:
         return redirect(url_for('login'))
     return render_template('admin_student_group_chat.html')
 
-@app.route('/admin/chat/<int:student_id>')
+@route('/admin/chat/<int:student_id>')
 def admin_chat(student_id):
     if 'admin_id' not in session:
         return redirect(url_for('login'))
-    messages = ChatMessage.query.filter_by(student_id=student_id).order_by(ChatMessage.created_at).all()
     student = User.query.get_or_404(student_id)
+    messages = student_thread(student_id)
     return render_template('admin_chat.html', messages=messages, student=student)
 
-@app.route('/api/chat/send', methods=['POST'])
+@route('/api/chat/send', methods=['POST'])
+@retry_busy
 def api_chat_send():
     data = request.json or {}
     text = data.get('message', '').strip()
@@ -807,6 +1390,7 @@ def api_chat_send():
         msg = ChatMessage(student_id=session['user_id'], admin_id=None, sender='student', message=text)
         db.session.add(msg)
         db.session.commit()
+        publish_chat(msg.id, msg.student_id)
         return jsonify({'success': True, 'id': msg.id, 'time': msg.created_at.strftime('%H:%M')})
     elif 'admin_id' in session:
         if not student_id:
@@ -814,61 +1398,96 @@ def api_chat_send():
         msg = ChatMessage(student_id=student_id, admin_id=session['admin_id'], sender='admin', message=text)
         db.session.add(msg)
         db.session.commit()
+        publish_chat(msg.id, msg.student_id)
         return jsonify({'success': True, 'id': msg.id, 'time': msg.created_at.strftime('%H:%M')})
     return jsonify({'success': False})
 
-@app.route('/api/chat/history/<int:student_id>')
+@route('/api/chat/history/<int:student_id>')
+@replica_reads
+@conditional(chat_history_stamp)
 def api_chat_history(student_id):
     if 'user_id' in session and session['user_id'] != student_id:
         return jsonify({'success': False})
     if 'admin_id' not in session and 'user_id' not in session:
         return jsonify({'success': False})
-    messages = ChatMessage.query.filter_by(student_id=student_id).order_by(ChatMessage.created_at).all()
+    # Optional cursors: only return messages/broadcasts newer than these ids
+    after_id = request.args.get('after_id', 0, type=int)
+    after_bid = request.args.get('after_broadcast_id', 0, type=int)
+    woke = {}
+    if request.args.get('wait'):
+        # Long-poll: block until this thread or the broadcast stream has something new.
+        # The bus can be ahead of the replica, so read what woke us from the primary.
+        read_primary()
+        latest = wait_for_chat({f'student:{student_id}': after_id, 'broadcast': after_bid})
+        woke = {'id': latest.get(f'student:{student_id}', 0), 'broadcast_id': latest.get('broadcast', 0)}
+    items, cursors = page_chat(student_messages(student_id), broadcasts_for(student_id), woke)
     out = [
         {
             'id': m.id,
             'sender': m.sender,
             'message': m.message,
+            'broadcast': m.is_broadcast,
             'time': m.created_at.strftime('%Y-%m-%d %H:%M')
-        } for m in messages
+        } for m, _ in items
     ]
-    return jsonify({'success': True, 'messages': out})
-
-@app.route('/api/chat/history-all')
+    delivered = [m.id for m, _ in items if m.is_broadcast]
+    if delivered and session.get('user_id') == student_id:
+        mark_broadcasts(student_id, delivered_id=max(delivered))
+    return jsonify({'success': True, 'messages': out, **cursors})
+
+@route('/api/chat/history-all')
+@replica_reads
+@conditional(chat_history_all_stamp)
 def api_chat_history_all():
     if 'admin_id' not in session:
         return jsonify({'success': False})
-    messages = ChatMessage.query.order_by(ChatMessage.created_at).all()
-    # Build sender display
-    def sender_of(m):
-        return 'admin' if m.sender == 'admin' else (User.query.get(m.student_id).name if m.student_id else 'Student')
+    woke = {}
+    if request.args.get('wait'):
+        read_primary()
+        latest = wait_for_chat({'all': request.args.get('after_id', 0, type=int),
+                                'broadcast': request.args.get('after_broadcast_id', 0, type=int)})
+        woke = {'id': latest.get('all', 0), 'broadcast_id': latest.get('broadcast', 0)}
+    # One joined query resolves every sender name for the page
+    query = db.session.query(ChatMessage, User.name).outerjoin(User, User.id == ChatMessage.student_id)
+    items, cursors = page_chat(query, BroadcastMessage.query, woke)
     out = [
         {
             'id': m.id,
-            'sender': sender_of(m),
+            'sender': 'admin' if m.sender == 'admin' else (name or 'Student'),
             'sender_type': 'admin' if m.sender == 'admin' else 'student',
             'message': m.message,
+            'broadcast': m.is_broadcast,
             'time': m.created_at.strftime('%Y-%m-%d %H:%M')
-        } for m in messages
+        } for m, name in items
     ]
-    return jsonify({'success': True, 'messages': out})
+    return jsonify({'success': True, 'messages': out, **cursors})
 
-@app.route('/api/chat/history-students')
+@route('/api/chat/history-students')
+@replica_reads
+@conditional(chat_history_students_stamp)
 def api_chat_history_students():
     if 'admin_id' not in session:
         return jsonify({'success': False})
-    messages = ChatMessage.query.filter(ChatMessage.sender == 'student').order_by(ChatMessage.created_at).all()
+    woke = {}
+    if request.args.get('wait'):
+        read_primary()
+        latest = wait_for_chat({'all': request.args.get('after_id', 0, type=int)})
+        woke = {'id': latest.get('all', 0)}
+    query = db.session.query(ChatMessage, User.name).outerjoin(User, User.id == ChatMessage.student_id) \
+        .filter(ChatMessage.sender == 'student')
+    items, cursors = page_chat(query, woke=woke)
     out = [
         {
             'id': m.id,
-            'sender': (User.query.get(m.student_id).name if m.student_id else 'Student'),
+            'sender': name or 'Student',
             'message': m.message,
             'time': m.created_at.strftime('%Y-%m-%d %H:%M')
-        } for m in messages
+        } for m, name in items
     ]
-    return jsonify({'success': True, 'messages': out})
+    return jsonify({'success': True, 'messages': out, **cursors})
 
-@app.route('/api/chat/send-admin-broadcast', methods=['POST'])
+@route('/api/chat/send-admin-broadcast', methods=['POST'])
+@retry_busy
 def api_chat_send_admin_broadcast():
     if 'admin_id' not in session:
         return jsonify({'success': False})
@@ -876,15 +1495,14 @@ def api_chat_send_admin_broadcast():
     text = (data.get('message') or '').strip()
     if not text:
         return jsonify({'success': False})
-    # Fan-out to all students (who exist). Could be optimized later.
-    students = User.query.all()
-    for s in students:
-        msg = ChatMessage(student_id=s.id, admin_id=session['admin_id'], sender='admin', message=text)
-        db.session.add(msg)
+    # One shared row; student threads merge it in at read time
+    broadcast = BroadcastMessage(admin_id=session['admin_id'], message=text)
+    db.session.add(broadcast)
     db.session.commit()
-    return jsonify({'success': True})
+    get_chat_bus().publish('broadcast', broadcast.id)
+    return jsonify({'success': True, 'id': broadcast.id})
 
-@app.route('/admin/student-progress/<int:student_id>')
+@route('/admin/student-progress/<int:student_id>')
 def admin_student_progress(student_id):
     if 'admin_id' not in session:
         return redirect(url_for('login'))
@@ -894,17 +1512,80 @@ def admin_student_progress(student_id):
     
     return render_template('admin_student_progress.html', student=student, progress=progress)
 
-@app.route('/admin/course/<int:course_id>/students')
+@route('/admin/course/<int:course_id>/students')
 def admin_course_students(course_id):
     if 'admin_id' not in session:
         return redirect(url_for('login'))
     
     course = Course.query.get_or_404(course_id)
-    enrollments = Enrollment.query.filter_by(course_id=course_id, status='approved').all()
+    query = Enrollment.query.options(db.joinedload(Enrollment.student)) \
+        .filter_by(course_id=course_id, status='approved')
+    q = request.args.get('q', '').strip()
+    if q:
+        query = query.filter(Enrollment.student.has(student_search(q)))
+    enrollments, pager = keyset_page(query, Enrollment.id)
+    # Reports only for the students on this page
+    reports = get_learning_tracker().generate_course_reports(course_id, [e.student_id for e in enrollments])
+    
+    return render_template('admin_course_students.html', course=course, enrollments=enrollments, reports=reports,
+                           pager=pager, q=q)
+
+@route('/admin/course/<int:course_id>/certificates', methods=['GET', 'POST'])
+def admin_course_certificates(course_id):
+    """POST queues a render job for every completed student's missing certificate; GET reports progress"""
+    if 'admin_id' not in session:
+        return jsonify({'success': False, 'error': 'Not authorized'})
     
-    return render_template('admin_course_students.html', course=course, enrollments=enrollments)
+    course = Course.query.get_or_404(course_id)
+    # One job per certificate, so every scheduler process's pool can take a share
+    jobs = course_certificate_jobs(db_execute, course_id)
+    counts = {'ready': 0, 'pending': 0, 'failed': 0, 'missing': 0}
+    for enrollment_id, student_id, name, completed_on in course_completions(course_id):
+        if certificate_cache.exists(certificate_cache.key(student_id, course.id, name, course.title, completed_on)):
+            counts['ready'] += 1
+            continue
+        status = jobs.get(enrollment_id)
+        if request.method == 'POST' and queue_certificate(enrollment_id, status):
+            status = 'pending'
+        counts[{'pending': 'pending', 'running': 'pending', 'failed': 'failed'}.get(status, 'missing')] += 1
+    if request.method == 'POST':
+        db.session.commit()
+    return jsonify({'success': True, 'total': sum(counts.values()), **counts})
 
-@app.route('/admin/add-chapter/<int:course_id>', methods=['GET', 'POST'])
+@route('/admin/course/<int:course_id>/certificates.zip')
+def admin_course_certificates_zip(course_id):
+    """Every completed student's certificate, streamed as one ZIP"""
+    if 'admin_id' not in session:
+        return redirect(url_for('login'))
+    
+    course = Course.query.get_or_404(course_id)
+    completions = course_completions(course_id)
+    if not completions:
+        flash('No students have completed this course yet', 'error')
+        return redirect(url_for('admin_course_students', course_id=course_id))
+    
+    # Web workers only stream what the scheduler has rendered; queue the rest
+    missing = [enrollment_id for enrollment_id, student_id, name, completed_on in completions
+               if not certificate_cache.exists(certificate_cache.key(student_id, course.id, name, course.title,
+                                                                      completed_on))]
+    if missing:
+        jobs = course_certificate_jobs(db_execute, course_id)
+        for enrollment_id in missing:
+            queue_certificate(enrollment_id, jobs.get(enrollment_id))
+        db.session.commit()
+        flash(f'{len(missing)} of {len(completions)} certificates are still being rendered; '
+              'download again once they are ready', 'info')
+        return redirect(url_for('admin_course_students', course_id=course_id))
+    
+    certificates = ((f'{secure_filename(name) or "student"}-{student_id}.pdf',
+                     student_id, course.id, name, course.title, completed_on)
+                    for enrollment_id, student_id, name, completed_on in completions)
+    filename = f'CourseHub-Certificates-{secure_filename(course.title) or course.id}.zip'
+    return Response(zip_certificates(certificate_cache, certificates), mimetype='application/zip',
+                    headers={'Content-Disposition': f'attachment; filename="{filename}"'})
+
+@route('/admin/add-chapter/<int:course_id>', methods=['GET', 'POST'])
+@retry_busy
 def admin_add_chapter(course_id):
     if 'admin_id' not in session:
         return redirect(url_for('login'))
@@ -925,7 +1606,13 @@ def admin_add_chapter(course_id):
             checkpoint=checkpoint
         )
         db.session.add(chapter)
+        db.session.flush()
+        # More chapters: students who had finished the course no longer have
+        refresh_course_completion(db_execute, course_id)
+        bump_version(db_execute)
         db.session.commit()
+        chapter_cache.invalidate_course(course_id)
+        catalog_cache.expire()
         
         flash('Chapter added successfully', 'success')
         return redirect(url_for('admin_edit_course', course_id=course_id))
@@ -936,7 +1623,39 @@ def admin_add_chapter(course_id):
     
     return render_template('admin_add_chapter.html', course=course, next_number=next_number)
 
-@app.route('/api/mark-notification-read/<int:notification_id>', methods=['POST'])
+@route('/api/notifications')
+def api_notifications():
+    """Newest first, `before_id` cursor; `unread=1` lists only unread ones"""
+    if 'user_id' not in session:
+        return jsonify({'success': False})
+    
+    user_id = session['user_id']
+    unread_count, read_through = inbox_state(db_execute, user_id)
+    if request.args.get('unread') == '1':
+        query = unread_notifications(user_id, read_through)
+    else:
+        query = user_notifications(user_id)
+    before_id = request.args.get('before_id', type=int)
+    if before_id:
+        query = query.filter(Notification.id < before_id)
+    limit = min(max(request.args.get('limit', NOTIFICATION_PAGE_SIZE, type=int), 1), 100)
+    rows = query.limit(limit + 1).all()
+    notifications = rows[:limit]
+    return jsonify({
+        'success': True,
+        'unread_count': unread_count,
+        'notifications': [{
+            'id': n.id,
+            'message': n.message,
+            'type': n.type,
+            'read': bool(n.read) or n.id <= read_through,
+            'created_at': n.created_at.strftime('%Y-%m-%d %H:%M')
+        } for n in notifications],
+        'next_before_id': notifications[-1].id if len(rows) > limit else None
+    })
+
+@route('/api/mark-notification-read/<int:notification_id>', methods=['POST'])
+@retry_busy
 def mark_notification_read(notification_id):
     if 'user_id' not in session:
         return jsonify({'success': False})
@@ -945,66 +1664,67 @@ def mark_notification_read(notification_id):
     if notification.user_id != session['user_id']:
         return jsonify({'success': False, 'error': 'Unauthorized'})
     
-    notification.read = True
+    mark_read(db_execute, notification.user_id, notification.id)
     db.session.commit()
-    return jsonify({'success': True})
+    return jsonify({'success': True, 'unread_count': inbox_state(db_execute, notification.user_id)[0]})
 
-@app.route('/api/mark-all-notifications-read', methods=['POST'])
+@route('/api/mark-all-notifications-read', methods=['POST'])
+@retry_busy
 def mark_all_notifications_read():
     if 'user_id' not in session:
         return jsonify({'success': False})
     
-    Notification.query.filter_by(user_id=session['user_id'], read=False).update({'read': True})
+    # Moves the user's read watermark; no notification rows are rewritten
+    mark_all_read(db_execute, session['user_id'])
     db.session.commit()
-    return jsonify({'success': True})
+    return jsonify({'success': True, 'unread_count': 0})
 
-@app.route('/logout')
+@route('/admin/metrics')
+def admin_metrics():
+    if 'admin_id' not in session:
+        return jsonify({'success': False, 'error': 'Not authorized'})
+    return jsonify({'success': True, 'progress_buffer': get_progress_buffer().stats(),
+                    'chapter_cache': chapter_cache.stats(), 'scheduler': get_scheduler().stats(),
+                    'certificate_cache': certificate_cache.stats(),
+                    'approval_cache': approval_cache.stats(),
+                    'catalog_cache': catalog_cache.stats(), 'conditional_get': conditional_stats(),
+                    'read_routing': routing_stats(),
+                    'chat_long_polls': dict(_chat_stats, max_waiters=CHAT_MAX_WAITERS)})
+
+@route('/logout')
 def logout():
     session.clear()
     return redirect(url_for('landing'))
 
-@app.route('/api/track-progress', methods=['POST'])
+@route('/api/track-progress', methods=['POST'])
 def track_progress():
     if 'user_id' not in session:
         return jsonify({'success': False})
     
-    data = request.json
-    chapter_id = data.get('chapter_id')
-    time_spent = data.get('time_spent', 0)
-    
-    progress = StudentProgress.query.filter_by(
-        student_id=session['user_id'],
-        chapter_id=chapter_id
-    ).first()
-    
-    if progress:
-        progress.time_spent += time_spent / 3600  # Convert seconds to hours
-    else:
-        chapter = Chapter.query.get(chapter_id)
-        if chapter:
-            progress = StudentProgress(
-                student_id=session['user_id'],
-                course_id=chapter.course_id,
-                chapter_id=chapter_id,
-                time_spent=time_spent / 3600
-            )
-            db.session.add(progress)
-    
-    db.session.commit()
+    data = request.get_json(silent=True)
+    try:
+        chapter_id = int(data.get('chapter_id'))
+        time_spent = float(data.get('time_spent', 0))
+    except (AttributeError, TypeError, ValueError):
+        return jsonify({'success': False})
     
-    # Use AI learning tracker to track interaction
-    tracker = AILearningTracker()
-    tracker.track_chapter_interaction(session['user_id'], chapter_id, time_spent)
+    # Buffered; written with other heartbeats on the next flush. This is the
+    # only write: the AI tracker reads the same student_progress rows.
+    if chapter_id > 0 and time_spent > 0:
+        time_spent = min(time_spent, HEARTBEAT_MAX_SECONDS)
+        get_progress_buffer().add(session['user_id'], chapter_id, time_spent / 3600)  # Convert seconds to hours
     
     return jsonify({'success': True})
 
-@app.route('/api/ai-recommendations/<int:chapter_id>')
+@route('/api/ai-recommendations/<int:chapter_id>')
+@replica_reads
+@conditional(recommendations_stamp)
 def ai_recommendations(chapter_id):
     if 'user_id' not in session:
         return jsonify({'error': 'Not logged in'})
     
     chapter = Chapter.query.get_or_404(chapter_id)
-    tracker = AILearningTracker()
+    tracker = get_learning_tracker()
     recommendations = tracker.get_recommended_content(
         session['user_id'],
         chapter.course_id,
@@ -1013,12 +1733,14 @@ def ai_recommendations(chapter_id):
     
     return jsonify(recommendations)
 
-@app.route('/api/learning-report/<int:course_id>')
+@route('/api/learning-report/<int:course_id>')
+@replica_reads
+@conditional(learning_report_stamp)
 def learning_report(course_id):
     if 'user_id' not in session:
         return jsonify({'error': 'Not logged in'})
     
-    tracker = AILearningTracker()
+    tracker = get_learning_tracker()
     report = tracker.generate_learning_report(session['user_id'], course_id)
     
     if report:
@@ -1026,5 +1748,130 @@ def learning_report(course_id):
     else:
         return jsonify({'error': 'No progress data found'})
 
+@route('/api/admin/learning-reports/<int:course_id>')
+def admin_learning_reports(course_id):
+    if 'admin_id' not in session:
+        return jsonify({'error': 'Not authorized'})
+    
+    reports = get_learning_tracker().generate_course_reports(course_id)
+    return jsonify({str(student_id): report for student_id, report in reports.items()})
+
+@click.command('init-db')
+@with_appcontext
+def init_db_command():
+    """Create or upgrade the database schema"""
+    init_db()
+    print('Database ready')
+
+@click.command('seed')
+@with_appcontext
+def seed_command():
+    """Add the default courses to an empty database"""
+    print(f'Added {seed_courses()} courses')
+
+@click.command('run-scheduler')
+@with_appcontext
+def run_scheduler_command():
+    """Run the job scheduler in the foreground (instead of ENABLE_AUTO_APPROVER in web workers)"""
+    approve_overdue_enrollments()
+    print('Scheduler running')
+    get_scheduler().run()
+
+def hot_queries():
+    """(name, statement, params, index) for check-query-plans, built by the same code the app runs"""
+    cutoff = datetime.datetime(2000, 1, 1)
+    return [
+        ('enrollment lookup', approved_enrollment_query(1, 1).statement, {}, 'uq_enrollment_student_course'),
+        ('due enrollments', APPROVE_DUE_SQL, {'now': cutoff, 'cutoff': cutoff, 'batch': APPROVAL_BATCH_SIZE},
+         'ix_enrollment_status_enrolled'),
+        ('chapter progress', CHAPTER_STAMP_SQL, {'student_id': 1, 'chapter_id': 1},
+         'uq_student_progress_student_chapter'),
+        ('completed chapters', completed_chapters_query(1, 1).statement, {}, 'ix_student_progress_student_course'),
+        ('unread notifications', unread_notifications(1, 0).limit(NOTIFICATION_PAGE_SIZE + 1).statement, {},
+         'ix_notification_user_id'),
+        ('notification page',
+         user_notifications(1).filter(Notification.id < 100).limit(NOTIFICATION_PAGE_SIZE + 1).statement, {},
+         'ix_notification_user_id'),
+        ('chat thread', chat_page_query(student_messages(1), ChatMessage.id, 0, None, CHAT_PAGE_SIZE, False).statement,
+         {}, 'ix_chat_message_student'),
+        ('course chapters', chapter_index_query(1).statement, {}, 'ix_chapter_course_number'),
+        ('queued job', CANCEL_JOB_SQL, {'kind': APPROVE_JOB, 'ref_id': 1}, 'ix_scheduled_job_ref_status'),
+    ]
+
+@click.command('check-query-plans')
+@with_appcontext
+def check_query_plans_command():
+    """Fail if a hot query stopped using its index (sqlite only)"""
+    failures = check_query_plans(db.engine, hot_queries())
+    for name, index, plan in failures:
+        print(f'{name}: expected {index}, plan was: {plan}')
+    if failures:
+        raise SystemExit(1)
+    print('All hot queries use their indexes')
+
+@click.command('sync-replica')
+@click.option('--interval', type=float, default=0, help='Keep copying every INTERVAL seconds')
+@with_appcontext
+def sync_replica_command(interval):
+    """Copy the sqlite primary onto the sqlite replica (a local stand-in for replication)"""
+    replica = db.engines.get(REPLICA_BIND)
+    if replica is None:
+        raise click.ClickException('DATABASE_REPLICA_URL is not set')
+    while True:
+        copy_sqlite(db.engine, replica)
+        print('Replica synced')
+        if not interval:
+            return
+        time.sleep(interval)
+
+def create_app(config=None):
+    """Build the Flask app: config, extensions, routes and CLI commands.
+
+    Does no database work and starts no threads: run `flask init-db` and
+    `flask seed` to prepare the database, and `flask run-scheduler` (or
+    bot.py, or ENABLE_AUTO_APPROVER=1) to run background jobs. Each app
+    gets its own chat bus, heartbeat buffer, scheduler, learning trackers
+    and certificate pool (see app_service), built when first needed.
+    """
+    app = Flask(__name__)
+    app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'your-secret-key-change-in-production')
+
+    # Ensure instance folder for sqlite exists
+    os.makedirs(os.path.join(app.root_path, 'instance'), exist_ok=True)
+
+    # Database URL with default to instance sqlite file
+    default_sqlite_path = os.path.join(app.root_path, 'instance', 'coursehub.db')
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', f'sqlite:///{default_sqlite_path}')
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['MAIL_SERVER'] = 'smtp.gmail.com'
+    app.config['MAIL_PORT'] = 587
+    app.config['MAIL_USE_TLS'] = True
+    app.config['MAIL_USERNAME'] = os.environ.get('MAIL_USERNAME', 'yourusername@gmail.com')
+    app.config['MAIL_PASSWORD'] = os.environ.get('MAIL_PASSWORD', 'password1234')
+    # Optional read replica; without one every query goes to DATABASE_URL
+    if os.environ.get('DATABASE_REPLICA_URL'):
+        app.config['SQLALCHEMY_BINDS'] = {REPLICA_BIND: os.environ['DATABASE_REPLICA_URL']}
+    if config:
+        app.config.update(config)
+
+    db.init_app(app)
+    mail.init_app(app)
+    with app.app_context():
+        for engine in db.engines.values():
+            tune_sqlite(engine)
+    for rule, options, view in _routes:
+        app.add_url_rule(rule, view_func=view, **options)
+    app.before_request(start_background_services)
+    app.after_request(remember_writes)
+    for command in (init_db_command, seed_command, run_scheduler_command, check_query_plans_command,
+                    sync_replica_command):
+        app.cli.add_command(command)
+    return app
+
+app = create_app()
+
 if __name__ == '__main__':
+    with app.app_context():
+        init_db()
+        seed_courses()
     app.run(host='0.0.0.0', port=int(os.environ.get('PORT', 5000)), debug=True)
@@ -0,0 +1,59 @@
+"""
+Enrollment approval cache for CourseHub
+Remembers whether a student may open a course, so chapter and course pages skip the enrollment lookup
+"""
+import threading
+import time
+from collections import OrderedDict
+
+
+class ApprovalCache:
+    """Process-local set of approved (student_id, course_id) pairs with a TTL.
+
+    Only approvals are cached: enrollments move from pending to approved,
+    often in another process (bot.py, run-scheduler, another worker), so a
+    "not approved" answer is always re-checked. Rejections made in this
+    process call invalidate(); `ttl` bounds how long one made elsewhere can
+    go unseen. At most `max_entries` pairs are kept, least recently used
+    dropped first.
+    """
+
+    def __init__(self, ttl=30, max_entries=100000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def approved(self, student_id, course_id, load):
+        """Whether the enrollment is approved; `load()` answers on a miss"""
+        key = (student_id, course_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and time.monotonic() - entry[0] < self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        approved = bool(load())
+        if not approved:
+            return False
+        with self._lock:
+            self._entries[key] = (time.monotonic(), True)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return True
+
+    def invalidate(self, student_id, course_id):
+        with self._lock:
+            self._entries.pop((student_id, course_id), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'ttl': self.ttl, 'hits': self.hits, 'misses': self.misses}
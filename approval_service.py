@@ -0,0 +1,74 @@
+"""
+Enrollment auto-approval service for CourseHub
+The approval write path run by the scheduler, in the web process or in bot.py
+"""
+import datetime
+
+from enrollment_rollup import record_status_change
+from notification_service import record_notifications
+
+# Scheduler job kind for a pending enrollment's delayed approval
+APPROVE_JOB = 'approve_enrollment'
+
+# One statement approves the whole set; the status guard leaves enrollments
+# an admin (or another worker) already handled alone
+APPROVE_IDS_SQL = """
+    UPDATE enrollment SET status = 'approved', approved_at = :now
+    WHERE id IN ({ids}) AND status = 'pending'
+    RETURNING id, student_id, course_id, enrolled_at
+"""
+
+APPROVE_DUE_SQL = """
+    UPDATE enrollment SET status = 'approved', approved_at = :now
+    WHERE id IN (
+        SELECT id FROM enrollment
+        WHERE status = 'pending' AND enrolled_at <= :cutoff
+        ORDER BY id
+        LIMIT :batch
+    )
+    AND status = 'pending'
+    RETURNING id, student_id, course_id, enrolled_at
+"""
+
+# Run as one executemany over the approved rows; the course title comes from the join
+NOTIFY_SQL = """
+    INSERT INTO notification (user_id, message, type, read, created_at)
+    SELECT :student_id,
+           'Your enrollment for ' || c.title || ' has been approved! You can now start learning.',
+           'success', :unread, :now
+    FROM course c
+    WHERE c.id = :course_id
+"""
+
+
+def _after_approval(execute, approved, now):
+    """Notify the students of freshly approved rows and move them in the dashboard rollup"""
+    if approved:
+        execute(NOTIFY_SQL, [{'student_id': student_id, 'course_id': course_id, 'unread': False, 'now': now}
+                             for _, student_id, course_id, _ in approved])
+        record_notifications(execute, [student_id for _, student_id, _, _ in approved])
+        record_status_change(execute, [(enrolled_at, course_id) for _, _, course_id, enrolled_at in approved],
+                             'pending', 'approved')
+    return len(approved)
+
+
+def approve_enrollments(execute, enrollment_ids, now=None):
+    """Approve still-pending enrollments and notify their students; returns the number approved"""
+    if not enrollment_ids:
+        return 0
+    now = now or datetime.datetime.utcnow()
+    params = {f'id{i}': enrollment_id for i, enrollment_id in enumerate(enrollment_ids)}
+    params['now'] = now
+    sql = APPROVE_IDS_SQL.format(ids=', '.join(f':id{i}' for i in range(len(enrollment_ids))))
+    return _after_approval(execute, execute(sql, params).fetchall(), now)
+
+
+def approve_due_batch(execute, cutoff, batch_size=1000, now=None):
+    """Approve up to `batch_size` enrollments pending since `cutoff`; returns the number approved.
+
+    Callers commit after each batch and repeat until fewer than
+    `batch_size` come back, so a large backlog never holds one long write lock.
+    """
+    now = now or datetime.datetime.utcnow()
+    approved = execute(APPROVE_DUE_SQL, {'now': now, 'cutoff': cutoff, 'batch': batch_size}).fetchall()
+    return _after_approval(execute, approved, now)
@@ -2,16 +2,24 @@
 Auto-enrollment approval bot for CourseHub
 This bot automatically approves course enrollments after 5 minutes
 """
-import sqlite3
-import time
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-from datetime import datetime, timedelta
 import os
+from datetime import datetime, timedelta
+from sqlalchemy import text
+from ai_learning_tracker import get_engine
+from approval_service import APPROVE_JOB, approve_due_batch, approve_enrollments
+from notification_service import COMPACT_JOB, compact_notifications
+from scheduler import Scheduler
 
 # Database path (match Flask default instance path)
 DB_PATH = os.environ.get('SQLITE_PATH', os.path.join(os.path.dirname(__file__), 'instance', 'coursehub.db'))
+DB_URL = os.environ.get('DATABASE_URL') or 'sqlite:///' + DB_PATH
+AUTO_APPROVE_DELAY = float(os.environ.get('AUTO_APPROVE_DELAY', 300))
+APPROVAL_BATCH_SIZE = int(os.environ.get('APPROVAL_BATCH_SIZE', 1000))
+NOTIFICATION_RETENTION_DAYS = float(os.environ.get('NOTIFICATION_RETENTION_DAYS', 30))
+NOTIFICATION_COMPACT_INTERVAL = float(os.environ.get('NOTIFICATION_COMPACT_INTERVAL', 3600))
 
 # Email configuration (same as app.py)
 MAIL_SERVER = os.environ.get('MAIL_SERVER', 'smtp.gmail.com')
@@ -38,91 +46,51 @@ def send_email(to_email, subject, body):
         print(f"Email error: {e}")
         return False
 
+def compact_notifications_job(execute, ref_ids):
+    return compact_notifications(execute, ref_ids, retention_days=NOTIFICATION_RETENTION_DAYS,
+                                 batch_size=APPROVAL_BATCH_SIZE, interval=NOTIFICATION_COMPACT_INTERVAL)
+
+def create_scheduler():
+    """The same scheduler the web app runs; jobs are claimed atomically, so both can run"""
+    return Scheduler(
+        get_engine(DB_URL),
+        {APPROVE_JOB: approve_enrollments, COMPACT_JOB: compact_notifications_job},
+        batch_size=int(os.environ.get('SCHEDULER_BATCH_SIZE', 100))
+    )
+
 def approve_enrollment(enrollment_id):
-    """Approve an enrollment and send email notification"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-    try:
-        # Get enrollment details
-        cursor.execute("""
-            SELECT e.student_id, e.course_id, u.name, u.email, c.title
-            FROM enrollment e
-            JOIN user u ON e.student_id = u.id
-            JOIN course c ON e.course_id = c.id
-            WHERE e.id = ? AND e.status = 'pending'
-        """, (enrollment_id,))
-        
-        result = cursor.fetchone()
-        if not result:
-            print(f"Enrollment {enrollment_id} not found or already processed")
-            return
-        
-        student_id, course_id, student_name, student_email, course_title = result
-        
-        # Update enrollment status
-        cursor.execute("""
-            UPDATE enrollment
-            SET status = 'approved', approved_at = ?
-            WHERE id = ?
-        """, (datetime.utcnow(), enrollment_id))
-        
-        conn.commit()
-        
-        # Create notification instead of sending email
-        cursor.execute("""
-            INSERT INTO notification (user_id, message, type, read, created_at)
-            VALUES (?, ?, ?, ?, ?)
-        """, (
-            student_id,
-            f"Your enrollment for {course_title} has been approved! You can now start learning.",
-            'success',
-            False,
-            datetime.utcnow()
-        ))
-        
-        print(f"Enrollment {enrollment_id} approved and notification created for user {student_id}")
-        
-    except Exception as e:
-        print(f"Error approving enrollment {enrollment_id}: {e}")
-        conn.rollback()
-    finally:
-        conn.close()
+    """Approve one enrollment right away and drop its queued job"""
+    with get_engine(DB_URL).begin() as conn:
+        execute = lambda sql, params: conn.execute(text(sql), params)
+        approved = approve_enrollments(execute, [enrollment_id])
+        create_scheduler().cancel(APPROVE_JOB, enrollment_id, execute=execute)
+    if approved:
+        print(f"Enrollment {enrollment_id} approved and notification created")
+    else:
+        print(f"Enrollment {enrollment_id} not found or already processed")
 
 def check_pending_enrollments():
-    """Check for enrollments that are 5 minutes old and approve them"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-    # Get enrollments that are 5+ minutes old and still pending
-    five_minutes_ago = datetime.utcnow() - timedelta(minutes=5)
-    
-    cursor.execute("""
-        SELECT id, enrolled_at
-        FROM enrollment
-        WHERE status = 'pending' AND enrolled_at <= ?
-    """, (five_minutes_ago,))
-    
-    enrollments = cursor.fetchall()
-    conn.close()
-    
-    for enrollment_id, enrolled_at in enrollments:
-        print(f"Processing enrollment {enrollment_id} (enrolled at {enrolled_at})")
-        approve_enrollment(enrollment_id)
+    """Approve every enrollment pending longer than the delay, one batch per transaction"""
+    cutoff = datetime.utcnow() - timedelta(seconds=AUTO_APPROVE_DELAY)
+    engine = get_engine(DB_URL)
+    total = 0
+    while True:
+        with engine.begin() as conn:
+            approved = approve_due_batch(lambda sql, params: conn.execute(text(sql), params),
+                                         cutoff, APPROVAL_BATCH_SIZE)
+        total += approved
+        if approved < APPROVAL_BATCH_SIZE:
+            break
+    if total:
+        print(f"Approved {total} overdue enrollments")
+    return total
 
 def run_bot():
-    """Main bot loop - runs every minute"""
+    """Main bot loop - catches up on overdue enrollments, then sleeps until the next approval falls due"""
     print("CourseHub Auto-Enrollment Bot Started")
-    print("Checking for pending enrollments every minute...")
-    
-    while True:
-        try:
-            check_pending_enrollments()
-        except Exception as e:
-            print(f"Error in bot loop: {e}")
-        
-        time.sleep(60)  # Check every minute
+    check_pending_enrollments()
+    print("Waiting for scheduled enrollment approvals...")
+    create_scheduler().run()
 
 if __name__ == '__main__':
     run_bot()
-
@@ -0,0 +1,173 @@
+"""
+Course catalog cache for CourseHub
+Keeps the course list and pages rendered from it per catalog version; admins bump the version
+in the database when they change a course, so every worker notices
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+
+# The course columns the landing page and dashboard show
+CatalogCourse = namedtuple('CatalogCourse', ['id', 'title', 'description', 'thumbnail', 'total_chapters',
+                                             'total_hours'])
+
+CATALOG_SQL = """
+    SELECT id, title, description, thumbnail, total_chapters, total_hours
+    FROM course
+    ORDER BY id
+"""
+
+# Row in cache_version shared by everything derived from the course and chapter
+# tables (the catalog here, chapter navigation in chapter_cache.py)
+CATALOG_VERSION = 'catalog'
+
+VERSION_SQL = "SELECT version FROM cache_version WHERE name = :name"
+
+# Versions only go up, and jump to the current time in ms when that is
+# higher, so a recreated database never reuses a version still in the shared store
+BUMP_SQL = """
+    INSERT INTO cache_version (name, version) VALUES (:name, :now)
+    ON CONFLICT (name) DO UPDATE SET version = CASE
+        WHEN excluded.version > cache_version.version THEN excluded.version
+        ELSE cache_version.version + 1
+    END
+"""
+
+
+def bump_version(execute, name=CATALOG_VERSION):
+    """Mark the catalog changed; run in the transaction that changes it"""
+    execute(BUMP_SQL, {'name': name, 'now': int(time.time() * 1000)})
+
+
+class SqliteStore:
+    """Cache entries shared by the worker processes of one host, in a sqlite file.
+
+    A local stand-in for a shared cache server: a worker that builds an
+    entry for a new version saves the others from rebuilding it. Values
+    must be JSON-serialisable.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS catalog_cache (
+                    key TEXT PRIMARY KEY,
+                    version INTEGER NOT NULL,
+                    value TEXT NOT NULL
+                )
+            """)
+            conn.commit()
+            self._local.conn = conn
+        return conn
+
+    def get(self, key, version):
+        row = self._connection().execute(
+            "SELECT value FROM catalog_cache WHERE key = ? AND version = ?", (key, version)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, key, version, value):
+        conn = self._connection()
+        conn.execute(
+            "INSERT OR REPLACE INTO catalog_cache (key, version, value) VALUES (?, ?, ?)",
+            (key, version, json.dumps(value))
+        )
+        conn.commit()
+
+
+def create_store(backend=None, sqlite_path=None):
+    """Shared store selected by CATALOG_CACHE_BACKEND: 'sqlite', or None for 'local' (per process only)"""
+    backend = backend or os.environ.get('CATALOG_CACHE_BACKEND', 'local')
+    if backend == 'sqlite':
+        path = sqlite_path or os.environ.get(
+            'CATALOG_CACHE_SQLITE_PATH',
+            os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'catalog_cache.db')
+        )
+        return SqliteStore(path)
+    if backend == 'local':
+        return None
+    raise ValueError(f'Unknown catalog cache backend: {backend}')
+
+
+class CatalogCache:
+    """The course list and named fragments (rendered pages) built from it.
+
+    Entries are keyed by the catalog version in cache_version, which each
+    process re-reads at most every `version_ttl` seconds; that bounds how
+    long another worker's edit can go unseen. A miss is looked up in the
+    shared `store` (if any) before it is built.
+    """
+
+    def __init__(self, store=None, version_ttl=1.0):
+        self.store = store
+        self.version_ttl = version_ttl
+        self._version = None
+        self._checked_at = 0
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+
+    def version(self, execute):
+        with self._lock:
+            if self._version is not None and time.monotonic() - self._checked_at < self.version_ttl:
+                return self._version
+        row = execute(VERSION_SQL, {'name': CATALOG_VERSION}).fetchone()
+        with self._lock:
+            self._version = row[0] if row else 0
+            self._checked_at = time.monotonic()
+            return self._version
+
+    def expire(self):
+        """Re-read the version on next use (after this process bumped it)"""
+        with self._lock:
+            self._version = None
+
+    def _get(self, key, version, build, decode=None):
+        """Local entry for this version, else the shared one, else `build()`; `decode` turns the
+        stored (JSON-safe) value into what callers get"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] == version:
+                self.hits += 1
+                return entry[1]
+        value = self.store.get(key, version) if self.store else None
+        if value is None:
+            value = build()
+            if self.store:
+                self.store.put(key, version, value)
+            counter = 'misses'
+        else:
+            counter = 'shared_hits'
+        if decode:
+            value = decode(value)
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+            self._entries[key] = (version, value)
+        return value
+
+    def courses(self, execute):
+        """All courses as CatalogCourse tuples, ordered by id"""
+        return self._get('courses', self.version(execute),
+                         lambda: [list(row) for row in execute(CATALOG_SQL, {})],
+                         lambda rows: [CatalogCourse(*row) for row in rows])
+
+    def fragment(self, name, execute, render):
+        """HTML `render()` produced for this catalog version"""
+        return self._get(f'fragment:{name}', self.version(execute), render)
+
+    def stats(self):
+        with self._lock:
+            return {'version': self._version, 'entries': len(self._entries), 'hits': self.hits,
+                    'shared_hits': self.shared_hits, 'misses': self.misses}
@@ -0,0 +1,380 @@
+"""
+Certificate rendering for CourseHub
+Draws completion certificates, keeps finished PDFs in a size-bounded disk cache,
+renders them on the scheduler's process pool and streams cached ones as ZIPs
+"""
+import atexit
+import hashlib
+import multiprocessing
+import os
+import shutil
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, wait as wait_futures
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+
+from PIL import Image
+from reportlab import rl_config
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.utils import ImageReader
+from reportlab.pdfgen import canvas
+
+BG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'img', 'certificate_bg.png')
+
+# Bump when the drawing below changes so cached PDFs are not reused
+TEMPLATE_VERSION = 2
+
+# Scheduler job that renders one certificate into the cache; ref_id is the enrollment
+CERTIFICATE_JOB = 'render_certificate'
+
+COURSE_JOBS_SQL = """
+    SELECT j.ref_id, j.status
+    FROM scheduled_job j JOIN enrollment e ON e.id = j.ref_id
+    WHERE j.kind = :kind AND e.course_id = :course_id
+"""
+
+# Embed image streams as binary; reportlab's pure-Python ASCII85 encoder costs
+# more than drawing the rest of a certificate
+rl_config.useA85 = 0
+
+_backgrounds = {}
+_backgrounds_lock = threading.Lock()
+
+
+def _background(path):
+    """Background image, converted to JPEG once per process (reportlab embeds JPEG data as is)"""
+    with _backgrounds_lock:
+        if path not in _backgrounds:
+            image = None
+            try:
+                if os.path.exists(path):
+                    jpeg = BytesIO()
+                    with Image.open(path) as source:
+                        source.convert('RGB').save(jpeg, 'JPEG', quality=90)
+                    image = ImageReader(BytesIO(jpeg.getvalue()))
+            except Exception as e:
+                print('Certificate background error:', e)
+            _backgrounds[path] = image
+        return _backgrounds[path]
+
+
+def _draw_background(pdf, path, width, height):
+    image = _background(path)
+    if image is None:
+        return
+    try:
+        pdf.drawImage(image, 0, 0, width=width, height=height)
+    except Exception as e:
+        print('Certificate background error:', e)
+
+
+def render_certificate(student_name, course_title, completed_on, bg_path=BG_PATH):
+    """PDF bytes of one completion certificate"""
+    buffer = BytesIO()
+    pdf = canvas.Canvas(buffer, pagesize=A4)
+    width, height = A4
+
+    _draw_background(pdf, bg_path, width, height)
+
+    # Title
+    pdf.setFillColorRGB(0.82, 0.05, 0.05)  # accent-ish
+    pdf.setFont('Helvetica-Bold', 28)
+    pdf.drawCentredString(width/2, height-120, 'CERTIFICATE OF COMPLETION')
+
+    # Presented to
+    pdf.setFillColorRGB(1,1,1)
+    pdf.setFont('Helvetica', 14)
+    pdf.drawCentredString(width/2, height-160, f'is presented to')
+
+    # Name
+    pdf.setFillColorRGB(1,1,1)
+    pdf.setFont('Helvetica-Bold', 24)
+    pdf.drawCentredString(width/2, height-200, student_name)
+
+    # Course
+    pdf.setFont('Helvetica', 14)
+    pdf.drawCentredString(width/2, height-230, f'for successfully completing {course_title}')
+
+    # Date
+    pdf.setFont('Helvetica-Oblique', 12)
+    pdf.drawCentredString(width/2, height-260, completed_on.strftime('Dated: %d %B %Y (UTC)'))
+
+    # Seal
+    pdf.circle(width/2, 140, 28, stroke=1, fill=0)
+    pdf.setFont('Helvetica', 10)
+    pdf.drawCentredString(width/2, 120, 'CourseHub')
+
+    pdf.showPage()
+    pdf.save()
+    return buffer.getvalue()
+
+
+def _write_atomic(path, data):
+    """Write to a temp name and rename, so readers never see a partial PDF"""
+    tmp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def _render_to_file(path, student_name, course_title, completed_on):
+    """Pool worker entry point: render one certificate straight into the cache; returns its size"""
+    data = render_certificate(student_name, course_title, completed_on)
+    _write_atomic(path, data)
+    return len(data)
+
+
+def course_certificate_jobs(execute, course_id):
+    """{enrollment_id: status} of a course's queued certificate jobs; a pending or running row wins over a failed one"""
+    jobs = {}
+    for ref_id, status in execute(COURSE_JOBS_SQL, {'kind': CERTIFICATE_JOB, 'course_id': course_id}):
+        if jobs.get(ref_id, 'failed') == 'failed':
+            jobs[ref_id] = status
+    return jobs
+
+
+class CertificateCache:
+    """Finished certificates on disk, named by a hash of everything drawn on them.
+
+    A hit refreshes the file's mtime; when the directory grows past
+    `max_bytes` the least recently used files are deleted. Files are
+    written to a temp name and renamed, so concurrent workers never
+    serve a partial PDF.
+    """
+
+    def __init__(self, directory, max_bytes=256 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._size = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(student_id, course_id, student_name, course_title, completed_on):
+        raw = f'{TEMPLATE_VERSION}|{student_id}|{course_id}|{student_name}|{course_title}|{completed_on:%Y-%m-%d}'
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, f'{key}.pdf')
+
+    def get(self, key):
+        """Path of a cached certificate, or None"""
+        path = self.path(key)
+        try:
+            os.utime(path)
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return path
+
+    def exists(self, key):
+        """Whether a certificate is cached, without counting a hit or refreshing it"""
+        return os.path.exists(self.path(key))
+
+    def put(self, key, data):
+        path = self.path(key)
+        _write_atomic(path, data)
+        return self.added(path, len(data))
+
+    def added(self, path, size):
+        """Account for a file written into the cache (here or by a pool worker)"""
+        with self._lock:
+            if self._size is not None:
+                self._size += size
+            over = self._size is None or self._size > self.max_bytes
+        if over:
+            self.evict(keep=path)
+        return path
+
+    def evict(self, keep=None):
+        """Delete least recently used files (never `keep`) until the cache fits in max_bytes"""
+        with self._lock:
+            files = []
+            for entry in os.scandir(self.directory):
+                if entry.name.endswith('.pdf'):
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    files.append((stat.st_mtime, stat.st_size, entry.path))
+            size = sum(f[1] for f in files)
+            for _, file_size, path in sorted(files):
+                if size <= self.max_bytes:
+                    break
+                if path == keep:
+                    continue
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                size -= file_size
+                self.evictions += 1
+            self._size = size
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                    'bytes': self._size, 'max_bytes': self.max_bytes}
+
+
+
+class CertificateRenderer:
+    """Renders certificates into a CertificateCache on a pool of worker processes.
+
+    Drawing a PDF is CPU-bound, so it runs in the process that handles
+    CERTIFICATE_JOB (the scheduler), where `workers` processes render in
+    parallel; web processes only queue jobs and stream cached files, and
+    never start a pool. Jobs are keyed by the cache key, so
+    asking for the same certificate twice shares one render. Workers are
+    spawned rather than forked, since the web process runs threads. With
+    `workers=0` certificates are rendered inline on the calling thread.
+    """
+
+    def __init__(self, cache, workers=1):
+        self.cache = cache
+        self.workers = workers
+        self._pool = None
+        self._jobs = {}
+        self._failed = set()
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.rendered = 0
+        self.errors = 0
+        atexit.register(self.shutdown)
+
+    def _executor(self):
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                             mp_context=multiprocessing.get_context('spawn'),
+                                             initializer=_background, initargs=(BG_PATH,))
+        return self._pool
+
+    def submit(self, student_id, course_id, student_name, course_title, completed_on):
+        """Queue a certificate unless it is cached or already rendering; returns its cache key"""
+        key = self.cache.key(student_id, course_id, student_name, course_title, completed_on)
+        if self.cache.exists(key):
+            return key
+        with self._lock:
+            if key in self._jobs:
+                return key
+            self._failed.discard(key)
+            self.submitted += 1
+            if self.workers > 0:
+                args = (_render_to_file, self.cache.path(key), student_name, course_title, completed_on)
+                try:
+                    future = self._executor().submit(*args)
+                except BrokenProcessPool:
+                    # A worker died (e.g. killed for memory); start a fresh pool
+                    self._pool = None
+                    future = self._executor().submit(*args)
+                self._jobs[key] = future
+        if self.workers > 0:
+            future.add_done_callback(lambda f: self._finished(key, f))
+        else:
+            self.cache.put(key, render_certificate(student_name, course_title, completed_on))
+            with self._lock:
+                self.rendered += 1
+        return key
+
+    def _finished(self, key, future):
+        try:
+            self.cache.added(self.cache.path(key), future.result())
+            failed = False
+        except Exception as e:
+            print(f'Certificate render error for {key}:', e)
+            failed = True
+        with self._lock:
+            self._jobs.pop(key, None)
+            if failed:
+                self.errors += 1
+                self._failed.add(key)
+            else:
+                self.rendered += 1
+
+    def status(self, key):
+        """'ready', 'pending', 'failed' or 'missing'"""
+        if self.cache.exists(key):
+            return 'ready'
+        with self._lock:
+            if key in self._jobs:
+                return 'pending'
+            return 'failed' if key in self._failed else 'missing'
+
+    def wait(self, keys, timeout=None):
+        """Block up to `timeout` seconds for the given jobs to finish"""
+        with self._lock:
+            futures = [self._jobs[key] for key in keys if key in self._jobs]
+        if futures:
+            wait_futures(futures, timeout=timeout)
+
+    def render_all(self, certificates):
+        """Render (student_id, course_id, student_name, course_title, completed_on) tuples and
+        wait for them; returns the keys that did not make it into the cache"""
+        keys = [self.submit(*fields) for fields in certificates]
+        self.wait(keys)
+        return [key for key in keys if not self.cache.exists(key)]
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self):
+        with self._lock:
+            return {'workers': self.workers, 'pending': len(self._jobs), 'submitted': self.submitted,
+                    'rendered': self.rendered, 'errors': self.errors}
+
+
+class _ZipStream:
+    """Write-only, unseekable sink for zipfile; drained after every entry"""
+
+    def __init__(self):
+        self._chunks = []
+        self._pos = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._pos += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._pos
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def zip_certificates(cache, certificates):
+    """Yield a ZIP of cached certificates piece by piece.
+
+    `certificates` yields (filename, student_id, course_id, student_name,
+    course_title, completed_on); each PDF is copied from the cache into the
+    archive and drained, so memory stays flat however many are exported.
+    """
+    stream = _ZipStream()
+    with zipfile.ZipFile(stream, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for filename, *fields in certificates:
+            _zip_one(cache, archive, filename, fields)
+            yield stream.drain()
+    yield stream.drain()
+
+
+def _zip_one(cache, archive, filename, fields):
+    with archive.open(filename, 'w') as entry:
+        try:
+            with open(cache.path(cache.key(*fields)), 'rb') as f:
+                shutil.copyfileobj(f, entry)
+        except FileNotFoundError:
+            # Evicted since the export was checked: draw it here
+            entry.write(render_certificate(*fields[2:]))
@@ -0,0 +1,105 @@
+"""
+Chapter content cache for CourseHub
+Keeps rendered chapter HTML and per-course chapter navigation in memory
+"""
+import threading
+from collections import OrderedDict, namedtuple
+
+from markupsafe import Markup
+
+PLACEHOLDER_HTML = '<p>Course content will be available soon. Please check back later.</p>'
+
+# Everything a chapter list or prev/next link needs, without the content blob
+ChapterNav = namedtuple('ChapterNav', ['id', 'chapter_number', 'title'])
+
+
+def render_content(content):
+    """Turn a stored chapter body into the HTML shown on the chapter page"""
+    return Markup(content) if content else Markup(PLACEHOLDER_HTML)
+
+
+def neighbours(index, chapter_id):
+    """(prev, next) entries around a chapter in a nav index, None at either end"""
+    position = next((i for i, ch in enumerate(index) if ch.id == chapter_id), None)
+    if position is None:
+        return None, None
+    prev_chapter = index[position - 1] if position > 0 else None
+    next_chapter = index[position + 1] if position < len(index) - 1 else None
+    return prev_chapter, next_chapter
+
+
+class ChapterCache:
+    """Process-local cache of rendered chapter HTML and course navigation.
+
+    Content is keyed by (chapter_id, updated_at): an edited chapter misses
+    and its old entry ages out of the LRU, which is bounded by `max_chars`.
+    Navigation indexes are kept with the version they were built at (a
+    counter stored in the database and bumped by every chapter or course
+    change), so every worker process rebuilds them after an edit.
+    """
+
+    def __init__(self, max_chars=32 * 1024 * 1024):
+        self.max_chars = max_chars
+        self._content = OrderedDict()
+        self._content_chars = 0
+        self._nav = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def content(self, chapter_id, updated_at, load):
+        """Rendered HTML for a chapter; `load()` returns the raw content on a miss"""
+        key = (chapter_id, updated_at)
+        with self._lock:
+            html = self._content.get(key)
+            if html is not None:
+                self._content.move_to_end(key)
+                self.hits += 1
+                return html
+            self.misses += 1
+        html = render_content(load())
+        with self._lock:
+            if key not in self._content:
+                self._content[key] = html
+                self._content_chars += len(html)
+            while self._content_chars > self.max_chars and len(self._content) > 1:
+                _, old = self._content.popitem(last=False)
+                self._content_chars -= len(old)
+        return html
+
+    def nav(self, course_id, version, load):
+        """Ordered ChapterNav list for a course at `version`; `load()` returns (id, number, title) rows"""
+        with self._lock:
+            entry = self._nav.get(course_id)
+            if entry and entry[0] == version:
+                return entry[1]
+        index = [ChapterNav(*row) for row in load()]
+        with self._lock:
+            self._nav[course_id] = (version, index)
+        return index
+
+    def invalidate_course(self, course_id):
+        """Forget a course's navigation index and its chapters' rendered HTML"""
+        with self._lock:
+            entry = self._nav.pop(course_id, None)
+            if not entry:
+                return
+            chapter_ids = {ch.id for ch in entry[1]}
+            for key in [k for k in self._content if k[0] in chapter_ids]:
+                self._content_chars -= len(self._content.pop(key))
+
+    def clear(self):
+        with self._lock:
+            self._content.clear()
+            self._content_chars = 0
+            self._nav.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'content_entries': len(self._content),
+                'content_chars': self._content_chars,
+                'nav_courses': len(self._nav),
+                'hits': self.hits,
+                'misses': self.misses,
+            }
@@ -0,0 +1,157 @@
+"""
+Chat message bus for CourseHub
+Wakes long-polling chat clients as soon as a new message is published
+"""
+import os
+import sqlite3
+import threading
+import time
+
+
+class MemoryBus:
+    """In-process bus that remembers the newest message id per channel"""
+
+    def __init__(self):
+        self._latest = {}
+        self._cond = threading.Condition()
+
+    def publish(self, channel, message_id):
+        """Record a new message on a channel and wake all waiters"""
+        with self._cond:
+            if message_id > self._latest.get(channel, 0):
+                self._latest[channel] = message_id
+            self._cond.notify_all()
+
+    def knows(self, channel):
+        with self._cond:
+            return channel in self._latest
+
+    def prime(self, channel, message_id):
+        """Seed a channel with the newest id already in the database"""
+        with self._cond:
+            self._latest[channel] = max(message_id, self._latest.get(channel, 0))
+
+    def latest(self, channel):
+        with self._cond:
+            return self._latest.get(channel, 0)
+
+    def wait(self, cursors, timeout):
+        """Block until any channel has a message newer than its cursor.
+
+        `cursors` maps channel -> last id the client has seen. Returns the
+        newest id of every watched channel, or None if the timeout expired.
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                latest = {c: self._latest.get(c, 0) for c in cursors}
+                if any(latest[c] > after_id for c, after_id in cursors.items()):
+                    return latest
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+
+
+class SqliteBus(MemoryBus):
+    """Multi-process bus backed by a small sqlite event table.
+
+    Publishers append a row; one poller thread per process picks up rows
+    written by other workers and feeds them into the local waiters, so
+    idle clients cost one cheap query per poll interval per process.
+    """
+
+    RETENTION_SECONDS = 300
+
+    def __init__(self, path, poll_interval=0.05):
+        super().__init__()
+        self.path = path
+        self.poll_interval = poll_interval
+        self._local = threading.local()
+        self._poller = None
+        self._poller_lock = threading.Lock()
+        conn = self._connection()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS chat_bus_event (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                channel TEXT NOT NULL,
+                message_id INTEGER NOT NULL,
+                created_at REAL NOT NULL
+            )
+        """)
+        conn.commit()
+        row = conn.execute("SELECT MAX(id) FROM chat_bus_event").fetchone()
+        self._cursor = row[0] or 0
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def publish(self, channel, message_id):
+        conn = self._connection()
+        conn.execute(
+            "INSERT INTO chat_bus_event (channel, message_id, created_at) VALUES (?, ?, ?)",
+            (channel, message_id, time.time())
+        )
+        conn.commit()
+        super().publish(channel, message_id)
+
+    def wait(self, cursors, timeout):
+        self._ensure_poller()
+        return super().wait(cursors, timeout)
+
+    def _ensure_poller(self):
+        with self._poller_lock:
+            if self._poller is None:
+                self._poller = threading.Thread(target=self._poll_loop, daemon=True)
+                self._poller.start()
+
+    def poll_once(self):
+        """Apply events written by other processes since the last poll"""
+        conn = self._connection()
+        rows = conn.execute(
+            "SELECT id, channel, message_id FROM chat_bus_event WHERE id > ? ORDER BY id",
+            (self._cursor,)
+        ).fetchall()
+        for event_id, channel, message_id in rows:
+            self._cursor = event_id
+            super().publish(channel, message_id)
+        return len(rows)
+
+    def prune(self):
+        conn = self._connection()
+        conn.execute(
+            "DELETE FROM chat_bus_event WHERE created_at < ?",
+            (time.time() - self.RETENTION_SECONDS,)
+        )
+        conn.commit()
+
+    def _poll_loop(self):
+        last_prune = time.monotonic()
+        while True:
+            try:
+                self.poll_once()
+                if time.monotonic() - last_prune > self.RETENTION_SECONDS:
+                    self.prune()
+                    last_prune = time.monotonic()
+            except Exception as e:
+                print('Chat bus poll error:', e)
+            time.sleep(self.poll_interval)
+
+
+def create_bus(backend=None, sqlite_path=None):
+    """Build the bus selected by CHAT_BUS_BACKEND ('memory' or 'sqlite')"""
+    backend = backend or os.environ.get('CHAT_BUS_BACKEND', 'memory')
+    if backend == 'sqlite':
+        path = sqlite_path or os.environ.get(
+            'CHAT_BUS_SQLITE_PATH',
+            os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'chat_bus.db')
+        )
+        return SqliteBus(path)
+    if backend == 'memory':
+        return MemoryBus()
+    raise ValueError(f'Unknown chat bus backend: {backend}')
@@ -0,0 +1,116 @@
+"""
+Read replica routing for CourseHub
+Sends the queries of read-only routes to a replica database and keeps every write on the primary;
+a user who just wrote reads from the primary for a while, so they always see their own changes
+"""
+import functools
+import os
+import sqlite3
+import threading
+import time
+
+from flask import current_app, g, has_request_context, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy.sql.elements import TextClause
+
+# Bind key of the replica in SQLALCHEMY_BINDS (set from DATABASE_REPLICA_URL)
+REPLICA_BIND = 'replica'
+
+# How long a user's reads stay on the primary after one of their requests
+# wrote; should cover the replica's lag
+STICKY_SECONDS = float(os.environ.get('REPLICA_STICKY_SECONDS', 10))
+
+_stats = {'replica_requests': 0, 'pinned_requests': 0, 'write_requests': 0, 'replica_queries': 0}
+_stats_lock = threading.Lock()
+
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def _is_write(clause):
+    if isinstance(clause, TextClause):
+        return not clause.text.lstrip().upper().startswith(('SELECT', 'WITH'))
+    return getattr(clause, 'is_dml', False)
+
+
+def _is_read(clause):
+    if isinstance(clause, TextClause):
+        return not _is_write(clause)
+    return getattr(clause, 'is_select', False)
+
+
+class RoutingSession(Session):
+    """db.session that reads from the replica inside views marked with replica_reads.
+
+    Flushes and INSERT/UPDATE/DELETE (ORM or raw SQL) always go to the
+    primary, and once a request has written, the rest of its reads do too.
+    Without a replica bind, or outside a request, it behaves exactly like
+    Flask-SQLAlchemy's session.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_request_context():
+            replica = self._db.engines.get(REPLICA_BIND)
+            if replica is not None:
+                if self._flushing or _is_write(clause):
+                    g.db_wrote = True
+                elif g.get('read_replica') and not g.get('db_wrote') and _is_read(clause):
+                    _count('replica_queries')
+                    return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def pinned():
+    """Whether this user wrote recently enough that the replica may not have it yet"""
+    return session.get('primary_until', 0) > time.time()
+
+
+def reading_replica():
+    """Whether this request's reads are currently served by the replica"""
+    return has_request_context() and bool(g.get('read_replica')) and not g.get('db_wrote')
+
+
+def replica_reads(view):
+    """Serve a read-only view's queries from the replica, unless its user just wrote"""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if REPLICA_BIND in current_app.config.get('SQLALCHEMY_BINDS', {}):
+            g.read_replica = not pinned()
+            _count('replica_requests' if g.read_replica else 'pinned_requests')
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def read_primary():
+    """Send the rest of this request's reads to the primary"""
+    g.read_replica = False
+
+
+def remember_writes(response):
+    """after_request hook: pin a user whose request wrote to the primary for STICKY_SECONDS"""
+    if g.get('db_wrote'):
+        session['primary_until'] = time.time() + STICKY_SECONDS
+        _count('write_requests')
+    return response
+
+
+def stats():
+    with _stats_lock:
+        return dict(_stats, sticky_seconds=STICKY_SECONDS)
+
+
+def copy_sqlite(primary, replica):
+    """Replication stand-in for local testing: copy the primary sqlite file onto the replica's.
+
+    Uses SQLite's online backup, so the primary stays writable and replica
+    readers see either the old or the new snapshot.
+    """
+    source = sqlite3.connect(primary.url.database)
+    target = sqlite3.connect(replica.url.database, timeout=30)
+    try:
+        source.backup(target)
+    finally:
+        target.close()
+        source.close()
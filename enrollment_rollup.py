@@ -0,0 +1,82 @@
+"""
+Enrollment rollup for the CourseHub admin dashboard
+Keeps enrollment counts per (month, course, status) so the dashboard never scans enrollment history
+"""
+from collections import Counter
+
+# Portable upsert (sqlite >= 3.24 and PostgreSQL)
+BUMP_SQL = """
+    INSERT INTO enrollment_rollup (month, course_id, status, count)
+    VALUES (:month, :course_id, :status, :delta)
+    ON CONFLICT (month, course_id, status) DO UPDATE SET count = enrollment_rollup.count + excluded.count
+"""
+
+# Month bucket of enrolled_at per dialect, for the full rebuild
+MONTH_SQL = {
+    'sqlite': "strftime('%Y-%m', enrolled_at)",
+    'postgresql': "to_char(enrolled_at, 'YYYY-MM')",
+}
+
+REBUILD_SQL = """
+    INSERT INTO enrollment_rollup (month, course_id, status, count)
+    SELECT {month} AS month, course_id, status, COUNT(*)
+    FROM enrollment
+    WHERE enrolled_at IS NOT NULL
+    GROUP BY {month}, course_id, status
+"""
+
+MONTHLY_SQL = "SELECT month, SUM(count) FROM enrollment_rollup GROUP BY month ORDER BY month"
+
+COURSE_SQL = """
+    SELECT c.title, SUM(r.count)
+    FROM enrollment_rollup r JOIN course c ON c.id = r.course_id
+    WHERE r.status = 'approved'
+    GROUP BY c.id, c.title
+"""
+
+TOTAL_SQL = "SELECT COALESCE(SUM(count), 0) FROM enrollment_rollup"
+
+
+def month_of(enrolled_at):
+    """YYYY-MM bucket; raw SQL on sqlite hands datetimes back as strings"""
+    if hasattr(enrolled_at, 'strftime'):
+        return enrolled_at.strftime('%Y-%m')
+    return str(enrolled_at)[:7]
+
+
+def record(execute, changes):
+    """Apply {(month, course_id, status): delta} to the rollup"""
+    params = [{'month': month, 'course_id': course_id, 'status': status, 'delta': delta}
+              for (month, course_id, status), delta in changes.items() if delta]
+    if params:
+        execute(BUMP_SQL, params)
+
+
+def record_enrollment(execute, enrolled_at, course_id, status='pending'):
+    record(execute, {(month_of(enrolled_at), course_id, status): 1})
+
+
+def record_status_change(execute, rows, old_status, new_status):
+    """Move enrollments between statuses; `rows` are (enrolled_at, course_id) pairs"""
+    changes = Counter()
+    for enrolled_at, course_id in rows:
+        if enrolled_at is None:
+            continue
+        changes[(month_of(enrolled_at), course_id, old_status)] -= 1
+        changes[(month_of(enrolled_at), course_id, new_status)] += 1
+    record(execute, changes)
+
+
+def rebuild(execute, dialect):
+    """Recount the rollup from the enrollment table with one GROUP BY"""
+    month = MONTH_SQL[dialect]
+    execute('DELETE FROM enrollment_rollup', {})
+    execute(REBUILD_SQL.format(month=month), {})
+
+
+def dashboard_series(execute):
+    """(total, {month: enrollments}, {course title: approved enrollments}) from the rollup"""
+    total = execute(TOTAL_SQL, {}).scalar()
+    monthly = {month: count for month, count in execute(MONTHLY_SQL, {}) if count}
+    courses = {title: count for title, count in execute(COURSE_SQL, {}) if count}
+    return total, monthly, courses
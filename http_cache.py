@@ -0,0 +1,75 @@
+"""
+Conditional GET for CourseHub
+Answers repeat requests with 304 Not Modified from cheap version stamps, before the view renders anything
+"""
+import functools
+import hashlib
+import os
+import threading
+
+from flask import make_response, request, session
+from werkzeug.http import is_resource_modified
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates')
+
+_release = None
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+def release():
+    """Digest of the templates, so a deploy that changes a page changes its ETags"""
+    global _release
+    if _release is None:
+        digest = hashlib.sha1()
+        for name in sorted(os.listdir(TEMPLATE_DIR)):
+            digest.update(name.encode('utf-8'))
+            with open(os.path.join(TEMPLATE_DIR, name), 'rb') as f:
+                digest.update(f.read())
+        _release = digest.hexdigest()
+    return _release
+
+
+def _count(endpoint, outcome):
+    with _stats_lock:
+        counts = _stats.setdefault(endpoint, {'not_modified': 0, 'full': 0})
+        counts[outcome] += 1
+
+
+def conditional(stamp):
+    """Give a GET view an ETag built from `stamp(*view_args)` and answer a matching If-None-Match with 304.
+
+    The stamp must be much cheaper than the view and change whenever the
+    response would: row timestamps, counters, newest ids, the user it is
+    for. It returns None when the view should just run (e.g. it is about
+    to redirect). Pages with flashed messages are never matched.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            parts = None if '_flashes' in session else stamp(*args, **kwargs)
+            if parts is None:
+                return view(*args, **kwargs)
+            etag = hashlib.sha1(repr((release(), request.full_path, parts)).encode('utf-8')).hexdigest()
+            if not is_resource_modified(request.environ, etag=etag):
+                _count(view.__name__, 'not_modified')
+                response = make_response('', 304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+                _count(view.__name__, 'full')
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+        return wrapper
+    return decorator
+
+
+def stats():
+    """Per-view counts of 304s and full responses, with the overall hit rate"""
+    with _stats_lock:
+        views = {endpoint: dict(counts) for endpoint, counts in _stats.items()}
+    not_modified = sum(c['not_modified'] for c in views.values())
+    total = not_modified + sum(c['full'] for c in views.values())
+    return {'views': views, 'hit_rate': round(not_modified / total, 4) if total else None}
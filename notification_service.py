@@ -0,0 +1,134 @@
+"""
+Notification inbox service for CourseHub
+Per-user unread counters, read watermarks and archiving of old read notifications
+"""
+import datetime
+import time
+from collections import Counter
+
+from scheduler import schedule_once
+
+# Scheduler job kind for the recurring archive sweep (ref_id is always 0)
+COMPACT_JOB = 'compact_notifications'
+
+NOTIFY_SQL = """
+    INSERT INTO notification (user_id, message, type, read, created_at)
+    VALUES (:user_id, :message, :type, :unread, :now)
+"""
+
+# Portable upsert (sqlite >= 3.24 and PostgreSQL)
+BUMP_SQL = """
+    INSERT INTO notification_inbox (user_id, unread, read_through)
+    VALUES (:user_id, :delta, 0)
+    ON CONFLICT (user_id) DO UPDATE SET unread = notification_inbox.unread + excluded.unread
+"""
+
+# A read never creates an inbox row, and never takes the count below zero
+# (CASE rather than max()/GREATEST so it runs on sqlite and PostgreSQL)
+DECREMENT_SQL = """
+    UPDATE notification_inbox SET unread = CASE WHEN unread > 0 THEN unread - 1 ELSE 0 END
+    WHERE user_id = :user_id
+"""
+
+UNREAD_SQL = "SELECT unread, read_through FROM notification_inbox WHERE user_id = :user_id"
+
+# Notifications at or below a user's read_through id count as read, so
+# "mark all as read" is one row update however many are unread
+MARK_READ_SQL = """
+    UPDATE notification SET read = :read
+    WHERE id = :id AND user_id = :user_id AND read = :unread
+      AND id > COALESCE((SELECT read_through FROM notification_inbox WHERE user_id = :user_id), 0)
+"""
+
+MARK_ALL_READ_SQL = """
+    INSERT INTO notification_inbox (user_id, unread, read_through)
+    VALUES (:user_id, 0, (SELECT COALESCE(MAX(id), 0) FROM notification WHERE user_id = :user_id))
+    ON CONFLICT (user_id) DO UPDATE SET unread = 0, read_through = excluded.read_through
+"""
+
+REBUILD_SQL = """
+    INSERT INTO notification_inbox (user_id, unread, read_through)
+    SELECT user_id, SUM(CASE WHEN read THEN 0 ELSE 1 END), 0
+    FROM notification
+    GROUP BY user_id
+"""
+
+# Oldest read notifications first; the id order lets the scan stop at the batch size
+ARCHIVABLE_SQL = """
+    SELECT n.id FROM notification n
+    LEFT JOIN notification_inbox i ON i.user_id = n.user_id
+    WHERE n.created_at < :cutoff AND (n.read = :read OR n.id <= COALESCE(i.read_through, 0))
+    ORDER BY n.id
+    LIMIT :batch
+"""
+
+ARCHIVE_SQL = """
+    INSERT INTO notification_archive (id, user_id, message, type, created_at, archived_at)
+    SELECT id, user_id, message, type, created_at, :now FROM notification WHERE id IN ({ids})
+"""
+
+DELETE_SQL = "DELETE FROM notification WHERE id IN ({ids})"
+
+
+def record_notifications(execute, user_ids):
+    """Count freshly inserted unread notifications, one user id per notification"""
+    params = [{'user_id': user_id, 'delta': delta} for user_id, delta in Counter(user_ids).items()]
+    if params:
+        execute(BUMP_SQL, params)
+
+
+def notify(execute, user_id, message, type='info', now=None):
+    execute(NOTIFY_SQL, {'user_id': user_id, 'message': message, 'type': type, 'unread': False,
+                         'now': now or datetime.datetime.utcnow()})
+    record_notifications(execute, [user_id])
+
+
+def inbox_state(execute, user_id):
+    """(unread count, read_through id) for a user"""
+    row = execute(UNREAD_SQL, {'user_id': user_id}).fetchone()
+    return (row[0], row[1]) if row else (0, 0)
+
+
+def mark_read(execute, user_id, notification_id):
+    """Mark one of the user's notifications read; returns whether it was unread"""
+    marked = execute(MARK_READ_SQL, {'id': notification_id, 'user_id': user_id,
+                                     'read': True, 'unread': False}).rowcount
+    if marked:
+        execute(DECREMENT_SQL, {'user_id': user_id})
+    return bool(marked)
+
+
+def mark_all_read(execute, user_id):
+    execute(MARK_ALL_READ_SQL, {'user_id': user_id})
+
+
+def rebuild(execute):
+    """Recount every inbox from the notification table"""
+    execute('DELETE FROM notification_inbox', {})
+    execute(REBUILD_SQL, {})
+
+
+def archive_read(execute, cutoff, batch_size=1000, now=None):
+    """Move up to `batch_size` notifications read and older than `cutoff` to the archive"""
+    ids = [row[0] for row in execute(ARCHIVABLE_SQL, {'cutoff': cutoff, 'read': True,
+                                                      'batch': batch_size})]
+    if ids:
+        params = {f'id{i}': notification_id for i, notification_id in enumerate(ids)}
+        placeholders = ', '.join(f':id{i}' for i in range(len(ids)))
+        execute(ARCHIVE_SQL.format(ids=placeholders), dict(params, now=now or datetime.datetime.utcnow()))
+        execute(DELETE_SQL.format(ids=placeholders), params)
+    return len(ids)
+
+
+def compact_notifications(execute, ref_ids, retention_days=30, batch_size=1000, interval=3600):
+    """Scheduler handler: archive one batch, then queue the next sweep.
+
+    A full batch means more are waiting, so the next run is immediate;
+    otherwise it comes back after `interval` seconds.
+    """
+    cutoff = datetime.datetime.utcnow() - datetime.timedelta(days=retention_days)
+    archived = archive_read(execute, cutoff, batch_size)
+    if archived:
+        print(f'Archived {archived} read notifications')
+    schedule_once(execute, COMPACT_JOB, 0, time.time() + (0 if archived >= batch_size else interval))
+    return archived
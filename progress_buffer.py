@@ -0,0 +1,133 @@
+"""
+Progress ingestion buffer for CourseHub
+Coalesces time-spent heartbeats per (student, chapter) and writes them in batches
+"""
+import atexit
+import threading
+import time
+
+from sqlite_tuning import is_busy
+
+
+class ProgressBuffer:
+    """Accumulates time_spent deltas in memory and flushes them in one batch.
+
+    A flush happens every `interval` seconds, as soon as `max_events`
+    heartbeats have been buffered, and once more at interpreter shutdown.
+    `flush_fn` receives {(student_id, chapter_id): hours} and does the write.
+    A batch that fails because the database is busy is kept for the next
+    flush; any other failure is retried key by key and the keys that still
+    fail are dropped (counted in `dropped_rows`), so one bad key cannot
+    block every later flush.
+    """
+
+    def __init__(self, flush_fn, interval=10.0, max_events=500):
+        self.flush_fn = flush_fn
+        self.interval = interval
+        self.max_events = max_events
+        self._pending = {}
+        self._pending_events = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self.buffered_events = 0
+        self.flushed_events = 0
+        self.flushed_rows = 0
+        self.flushes = 0
+        self.errors = 0
+        self.dropped_rows = 0
+        atexit.register(self.shutdown)
+
+    def add(self, student_id, chapter_id, hours):
+        """Buffer one heartbeat; flushes inline when the event limit is hit"""
+        with self._lock:
+            key = (student_id, chapter_id)
+            self._pending[key] = self._pending.get(key, 0) + hours
+            self._pending_events += 1
+            self.buffered_events += 1
+            full = self._pending_events >= self.max_events
+        self._ensure_thread()
+        if full:
+            self.flush()
+
+    def flush(self):
+        """Write everything buffered so far; returns the number of rows written"""
+        with self._flush_lock:
+            with self._lock:
+                pending, events = self._pending, self._pending_events
+                self._pending, self._pending_events = {}, 0
+            if not pending:
+                return 0
+            try:
+                self.flush_fn(pending)
+            except Exception as e:
+                print('Progress flush error:', e)
+                self.errors += 1
+                if is_busy(e):
+                    self._requeue(pending, events)
+                    return 0
+                return self._flush_each(pending, events)
+            self.flushes += 1
+            self.flushed_events += events
+            self.flushed_rows += len(pending)
+            return len(pending)
+
+    def _requeue(self, pending, events):
+        """Put deltas back so the next flush retries them"""
+        with self._lock:
+            for key, hours in pending.items():
+                self._pending[key] = self._pending.get(key, 0) + hours
+            self._pending_events += events
+
+    def _flush_each(self, pending, events):
+        """Write a failed batch one key at a time, dropping the keys that cannot be written"""
+        written = 0
+        for key, hours in pending.items():
+            try:
+                self.flush_fn({key: hours})
+            except Exception as e:
+                if is_busy(e):
+                    self._requeue({key: hours}, 1)
+                    continue
+                print(f'Progress flush dropped {key}:', e)
+                self.dropped_rows += 1
+                continue
+            written += 1
+        self.flushes += 1
+        # Per-key event counts are not kept; count one event for each key not written
+        self.flushed_events += max(events - (len(pending) - written), written)
+        self.flushed_rows += written
+        return written
+
+    def shutdown(self):
+        """Final flush at process exit, reporting what was ingested"""
+        self.flush()
+        if self.buffered_events:
+            print('Progress buffer: {buffered_events} events buffered, {flushed_events} flushed '
+                  'as {flushed_rows} rows in {flushes} flushes'.format(**self.stats()))
+
+    def stats(self):
+        with self._lock:
+            return {
+                'pending_events': self._pending_events,
+                'pending_rows': len(self._pending),
+                'buffered_events': self.buffered_events,
+                'flushed_events': self.flushed_events,
+                'flushed_rows': self.flushed_rows,
+                'flushes': self.flushes,
+                'errors': self.errors,
+                'dropped_rows': self.dropped_rows,
+            }
+
+    def _ensure_thread(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            self.flush()
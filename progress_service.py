@@ -0,0 +1,178 @@
+"""
+Progress update service for CourseHub
+The one write path for chapter progress, shared by the Flask app and the AI tracker.
+It also maintains course_progress_summary, the per (student, course) rollup that
+course pages, certificates and reports read instead of re-aggregating.
+"""
+import datetime
+
+# Run as one executemany over a flush: the first heartbeat for a chapter inserts
+# the row (course_id from the chapter), later ones add to it atomically on the
+# unique (student_id, chapter_id) index, so concurrent flushes never lose time
+ADD_TIME_SQL = """
+    INSERT INTO student_progress (student_id, course_id, chapter_id, completed, time_spent)
+    SELECT :student_id, course_id, :chapter_id, :completed, :hours
+    FROM chapter WHERE id = :chapter_id
+    ON CONFLICT (student_id, chapter_id)
+    DO UPDATE SET time_spent = COALESCE(student_progress.time_spent, 0) + excluded.time_spent
+"""
+
+CHAPTER_COURSES_SQL = "SELECT id, course_id FROM chapter WHERE id IN ({ids})"
+
+SUMMARIES_SQL = """
+    SELECT student_id, course_id FROM course_progress_summary
+    WHERE student_id IN ({students}) AND course_id IN ({courses})
+"""
+
+# Run as one executemany, one row per (student, course) in a flush. The upsert
+# cannot report which rows were new, so started_count is recounted on the
+# (student_id, course_id) index instead of incremented.
+SUMMARY_ADD_TIME_SQL = """
+    UPDATE course_progress_summary
+    SET total_time = total_time + :hours,
+        started_count = (SELECT COUNT(*) FROM student_progress
+                         WHERE student_id = :student_id AND course_id = :course_id),
+        last_activity = :now
+    WHERE student_id = :student_id AND course_id = :course_id
+"""
+
+# Completion only counts once: rows already completed are left alone
+COMPLETE_SQL = """
+    UPDATE student_progress
+    SET completed = :completed, completed_at = :now
+    WHERE student_id = :student_id AND chapter_id = :chapter_id
+      AND (completed IS NULL OR completed = :not_completed)
+"""
+
+INSERT_COMPLETED_SQL = """
+    INSERT INTO student_progress (student_id, course_id, chapter_id, completed, completed_at, time_spent)
+    SELECT :student_id, course_id, :chapter_id, :completed, :now, 0
+    FROM chapter
+    WHERE id = :chapter_id AND NOT EXISTS (
+        SELECT 1 FROM student_progress WHERE student_id = :student_id AND chapter_id = :chapter_id
+    )
+"""
+
+SUMMARY_COMPLETE_SQL = """
+    UPDATE course_progress_summary
+    SET completed_count = completed_count + 1,
+        started_count = started_count + :new_row,
+        last_activity = :now,
+        all_completed = CASE
+            WHEN completed_count + 1 >= (SELECT COUNT(*) FROM chapter WHERE course_id = :course_id)
+            THEN :completed ELSE :not_completed END
+    WHERE student_id = :student_id AND course_id = :course_id
+"""
+
+SUMMARY_DELETE_SQL = """
+    DELETE FROM course_progress_summary WHERE student_id = :student_id AND course_id = :course_id
+"""
+
+# Full recount for one (student, course): used to create missing rows
+SUMMARY_REBUILD_SQL = """
+    INSERT INTO course_progress_summary
+        (student_id, course_id, started_count, completed_count, total_time, last_activity, all_completed)
+    SELECT :student_id, :course_id,
+           COUNT(sp.id),
+           COALESCE(SUM(CASE WHEN sp.completed THEN 1 ELSE 0 END), 0),
+           COALESCE(SUM(sp.time_spent), 0),
+           :now,
+           CASE WHEN ch.total > 0 AND COALESCE(SUM(CASE WHEN sp.completed THEN 1 ELSE 0 END), 0) >= ch.total
+                THEN :completed ELSE :not_completed END
+    FROM (SELECT COUNT(*) AS total FROM chapter WHERE course_id = :course_id) ch
+    LEFT JOIN student_progress sp ON sp.student_id = :student_id
+        AND sp.chapter_id IN (SELECT id FROM chapter WHERE course_id = :course_id)
+    GROUP BY ch.total
+"""
+
+# A course's chapter count changed: re-derive every student's all_completed flag
+SUMMARY_COURSE_COMPLETION_SQL = """
+    UPDATE course_progress_summary
+    SET all_completed = CASE
+        WHEN :total > 0 AND completed_count >= :total THEN :completed ELSE :not_completed END
+    WHERE course_id = :course_id
+"""
+
+COURSE_CHAPTER_COUNT_SQL = "SELECT COUNT(*) FROM chapter WHERE course_id = :course_id"
+
+
+def _in(prefix, values):
+    """Placeholders and params for an IN list"""
+    params = {f'{prefix}{i}': value for i, value in enumerate(values)}
+    return ', '.join(f':{name}' for name in params), params
+
+
+def _flags(params):
+    # Booleans are bound rather than written as literals so sqlite and Postgres agree
+    params.update(completed=True, not_completed=False)
+    return params
+
+
+def rebuild_summary(execute, student_id, course_id, now=None):
+    """Recount one student's course summary from student_progress"""
+    params = _flags({'student_id': student_id, 'course_id': course_id,
+                     'now': now or datetime.datetime.utcnow()})
+    execute(SUMMARY_DELETE_SQL, params)
+    execute(SUMMARY_REBUILD_SQL, params)
+
+
+def refresh_course_completion(execute, course_id):
+    """Re-derive all_completed for a course after its chapters changed"""
+    total = execute(COURSE_CHAPTER_COUNT_SQL, {'course_id': course_id}).fetchone()[0]
+    execute(SUMMARY_COURSE_COMPLETION_SQL, _flags({'course_id': course_id, 'total': total}))
+
+
+def complete_chapter(execute, student_id, chapter_id, course_id, now=None):
+    """Mark a chapter completed; returns True if it was not completed before"""
+    params = _flags({'student_id': student_id, 'chapter_id': chapter_id, 'course_id': course_id,
+                     'now': now or datetime.datetime.utcnow()})
+    new_row = 0
+    if execute(COMPLETE_SQL, params).rowcount == 0:
+        if execute(INSERT_COMPLETED_SQL, params).rowcount == 0:
+            return False  # already completed (or unknown chapter)
+        new_row = 1
+    params['new_row'] = new_row
+    if execute(SUMMARY_COMPLETE_SQL, params).rowcount == 0:
+        rebuild_summary(execute, student_id, course_id, params['now'])
+    return True
+
+
+def add_time_spent(execute, deltas):
+    """Add {(student_id, chapter_id): hours} to student_progress.
+
+    `execute(sql, params)` runs one statement with named parameters, or an
+    executemany when params is a list (a SQLAlchemy session or connection
+    with text() fits). A flush costs a fixed number of statements however
+    many keys it has: the chapter lookup, one upsert executemany, the
+    summary lookup and one summary executemany; only summaries that do not
+    exist yet are rebuilt one by one. Keys for unknown chapters are skipped.
+    Returns the number of rows touched.
+    """
+    if not deltas:
+        return 0
+    now = datetime.datetime.utcnow()
+    ids, params = _in('chapter', sorted({chapter_id for _, chapter_id in deltas}))
+    course_of = dict(execute(CHAPTER_COURSES_SQL.format(ids=ids), params).fetchall())
+    rows = [{'student_id': student_id, 'chapter_id': chapter_id, 'hours': hours, 'completed': False}
+            for (student_id, chapter_id), hours in deltas.items() if chapter_id in course_of]
+    if not rows:
+        return 0
+    execute(ADD_TIME_SQL, rows)
+
+    course_hours = {}
+    for row in rows:
+        key = (row['student_id'], course_of[row['chapter_id']])
+        course_hours[key] = course_hours.get(key, 0) + row['hours']
+    students, student_params = _in('student', sorted({student_id for student_id, _ in course_hours}))
+    courses, course_params = _in('course', sorted({course_id for _, course_id in course_hours}))
+    existing = set(map(tuple, execute(SUMMARIES_SQL.format(students=students, courses=courses),
+                                      {**student_params, **course_params}).fetchall()))
+    updates = [{'student_id': student_id, 'course_id': course_id, 'hours': hours, 'now': now}
+               for (student_id, course_id), hours in course_hours.items() if (student_id, course_id) in existing]
+    if updates:
+        execute(SUMMARY_ADD_TIME_SQL, updates)
+    for student_id, course_id in course_hours:
+        if (student_id, course_id) not in existing:
+            # Older data without a summary: the recount already includes this flush
+            rebuild_summary(execute, student_id, course_id, now)
+    return len(rows)
@@ -0,0 +1,263 @@
+"""
+Delayed job scheduler for CourseHub
+Runs jobs stored in the scheduled_job table when they fall due, from any number of processes
+"""
+import heapq
+import os
+import socket
+import threading
+import time
+import uuid
+
+from sqlalchemy import bindparam, text
+
+from sqlite_tuning import run_with_retry
+
+INSERT_SQL = """
+    INSERT INTO scheduled_job (kind, ref_id, run_at, status, attempts)
+    VALUES (:kind, :ref_id, :run_at, 'pending', 0)
+"""
+
+# Recurring jobs keep at most one pending row per (kind, ref_id)
+INSERT_ONCE_SQL = """
+    INSERT INTO scheduled_job (kind, ref_id, run_at, status, attempts)
+    SELECT :kind, :ref_id, :run_at, 'pending', 0
+    WHERE NOT EXISTS (
+        SELECT 1 FROM scheduled_job WHERE kind = :kind AND ref_id = :ref_id AND status = 'pending'
+    )
+"""
+
+CANCEL_SQL = """
+    DELETE FROM scheduled_job WHERE kind = :kind AND ref_id = :ref_id AND status = 'pending'
+"""
+
+# Earliest job this process should wake up for, including leases that have expired;
+# like claiming, it only considers the kinds this process has handlers for
+NEXT_DUE_SQL = """
+    SELECT MIN(CASE WHEN status = 'pending' THEN run_at ELSE claimed_at + :lease END)
+    FROM scheduled_job
+    WHERE (status = 'pending' OR status = 'running') AND kind IN :kinds
+"""
+
+# Claiming is one UPDATE guarded by the status it expects, so a job is only
+# ever handed to one worker; the token identifies the rows this claim won
+CLAIM_SQL = """
+    UPDATE scheduled_job
+    SET status = 'running', claimed_by = :token, claimed_at = :now, attempts = attempts + 1
+    WHERE id IN (
+        SELECT id FROM scheduled_job
+        WHERE ((status = 'pending' AND run_at <= :now)
+               OR (status = 'running' AND claimed_at < :stale))
+          AND kind IN :kinds
+        ORDER BY run_at
+        LIMIT :batch
+    )
+    AND ((status = 'pending' AND run_at <= :now) OR (status = 'running' AND claimed_at < :stale))
+"""
+
+CLAIMED_SQL = """
+    SELECT kind, ref_id FROM scheduled_job WHERE claimed_by = :token ORDER BY run_at
+"""
+
+DONE_SQL = "DELETE FROM scheduled_job WHERE claimed_by = :token AND kind = :kind"
+
+RETRY_SQL = """
+    UPDATE scheduled_job
+    SET status = CASE WHEN attempts >= :max_attempts THEN 'failed' ELSE 'pending' END,
+        run_at = :retry_at, claimed_by = NULL, claimed_at = NULL
+    WHERE claimed_by = :token AND kind = :kind
+"""
+
+DEPTH_SQL = """
+    SELECT status, COUNT(*), MIN(run_at),
+           SUM(CASE WHEN status = 'pending' AND run_at <= :now THEN 1 ELSE 0 END)
+    FROM scheduled_job
+    GROUP BY status
+"""
+
+
+# Pending or running rows first, so a job queued again after failing reports its new run
+JOB_STATUS_SQL = """
+    SELECT status FROM scheduled_job WHERE kind = :kind AND ref_id = :ref_id
+    ORDER BY CASE status WHEN 'failed' THEN 1 ELSE 0 END
+    LIMIT 1
+"""
+
+
+def schedule_once(execute, kind, ref_id, run_at):
+    """Queue a job unless one is already pending for (kind, ref_id); returns 1 if queued.
+
+    Recurring handlers call this with their `execute` to queue their next
+    run; running schedulers pick it up on their next refresh.
+    """
+    return execute(INSERT_ONCE_SQL, {'kind': kind, 'ref_id': ref_id, 'run_at': run_at}).rowcount
+
+
+def job_status(execute, kind, ref_id):
+    """'pending', 'running' or 'failed' for a queued job, or None once it has finished"""
+    return execute(JOB_STATUS_SQL, {'kind': kind, 'ref_id': ref_id}).scalar()
+
+
+class Scheduler:
+    """Durable delay queue with one wake-up thread per process.
+
+    Jobs are (kind, ref_id, run_at) rows; `handlers` maps a kind to
+    `fn(execute, ref_ids)`, called inside the transaction that deletes the
+    finished jobs; a process only claims kinds it has a handler for. The thread sleeps on a heap of known due times until the
+    earliest one, and re-reads the table's next due time every
+    `refresh_interval` seconds to pick up jobs scheduled by other processes.
+    A claimed job whose worker died is retried once its `lease` expires.
+    """
+
+    def __init__(self, engine, handlers, batch_size=100, lease=300, retry_delay=60,
+                 max_attempts=5, refresh_interval=30):
+        self.engine = engine
+        self.handlers = handlers
+        self.batch_size = batch_size
+        self.lease = lease
+        self.retry_delay = retry_delay
+        self.max_attempts = max_attempts
+        self.refresh_interval = refresh_interval
+        self.worker_id = f'{socket.gethostname()}:{os.getpid()}'
+        self._kinds = list(handlers)
+        self._claim_sql = text(CLAIM_SQL).bindparams(bindparam('kinds', expanding=True))
+        self._next_due_sql = text(NEXT_DUE_SQL).bindparams(bindparam('kinds', expanding=True))
+        self._heap = []
+        self._queued = set()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._looping = False
+        self.claimed = 0
+        self.completed = 0
+        self.errors = 0
+
+    def schedule(self, kind, ref_id, delay=0, run_at=None, execute=None):
+        """Queue a job; pass the caller's `execute` to insert it in their transaction"""
+        run_at = run_at if run_at is not None else time.time() + delay
+        params = {'kind': kind, 'ref_id': ref_id, 'run_at': run_at}
+        if execute is not None:
+            execute(INSERT_SQL, params)
+        else:
+            with self.engine.begin() as conn:
+                conn.execute(text(INSERT_SQL), params)
+        self.wake_at(run_at)
+        return run_at
+
+    def cancel(self, kind, ref_id, execute=None):
+        """Drop a job that has not started yet"""
+        params = {'kind': kind, 'ref_id': ref_id}
+        if execute is not None:
+            return execute(CANCEL_SQL, params).rowcount
+        with self.engine.begin() as conn:
+            return conn.execute(text(CANCEL_SQL), params).rowcount
+
+    def wake_at(self, run_at):
+        """Make the loop wake up no later than `run_at`.
+
+        A no-op unless this process runs the loop (run() or start()): only
+        the loop pops due times, and its refresh finds jobs queued before.
+        """
+        with self._cond:
+            if self._looping and run_at not in self._queued:
+                self._queued.add(run_at)
+                heapq.heappush(self._heap, run_at)
+                self._cond.notify()
+
+    def refresh(self):
+        with self.engine.connect() as conn:
+            next_due = conn.execute(self._next_due_sql, {'lease': self.lease, 'kinds': self._kinds}).scalar()
+        if next_due is not None:
+            self.wake_at(float(next_due))
+        return next_due
+
+    def run_due(self):
+        """Claim and run due jobs batch by batch; returns how many were handled"""
+        handled = 0
+        while True:
+            token = f'{self.worker_id}:{uuid.uuid4().hex}'
+            jobs = run_with_retry(lambda: self._claim(token))
+            if not jobs:
+                return handled
+            self.claimed += len(jobs)
+            by_kind = {}
+            for kind, ref_id in jobs:
+                by_kind.setdefault(kind, []).append(ref_id)
+            for kind, ref_ids in by_kind.items():
+                self._run(token, kind, ref_ids)
+            handled += len(jobs)
+            if len(jobs) < self.batch_size:
+                return handled
+
+    def _claim(self, token):
+        now = time.time()
+        with self.engine.begin() as conn:
+            conn.execute(self._claim_sql, {'token': token, 'now': now, 'stale': now - self.lease,
+                                           'batch': self.batch_size, 'kinds': self._kinds})
+            return conn.execute(text(CLAIMED_SQL), {'token': token}).fetchall()
+
+    def _run(self, token, kind, ref_ids):
+        def work():
+            with self.engine.begin() as conn:
+                handler(lambda sql, params: conn.execute(text(sql), params), ref_ids)
+                conn.execute(text(DONE_SQL), {'token': token, 'kind': kind})
+        try:
+            handler = self.handlers[kind]
+            run_with_retry(work)
+            self.completed += len(ref_ids)
+        except Exception as e:
+            print(f'Scheduler error running {kind} {ref_ids}:', e)
+            self.errors += 1
+            retry_at = time.time() + self.retry_delay
+            with self.engine.begin() as conn:
+                conn.execute(text(RETRY_SQL), {'token': token, 'kind': kind, 'retry_at': retry_at,
+                                               'max_attempts': self.max_attempts})
+            self.wake_at(retry_at)
+
+    def run(self):
+        """Scheduler loop: sleep until the next due time, then run what is due"""
+        with self._cond:
+            self._looping = True
+        next_refresh = 0
+        while True:
+            try:
+                if time.time() >= next_refresh:
+                    self.refresh()
+                    next_refresh = time.time() + self.refresh_interval
+                with self._cond:
+                    now = time.time()
+                    next_due = self._heap[0] if self._heap else float('inf')
+                    wait = min(next_due, next_refresh) - now
+                    if wait > 0:
+                        self._cond.wait(wait)
+                        continue
+                    while self._heap and self._heap[0] <= now:
+                        self._queued.discard(heapq.heappop(self._heap))
+                self.run_due()
+                self.refresh()
+            except Exception as e:
+                print('Scheduler loop error:', e)
+                time.sleep(self.retry_delay)
+
+    def start(self):
+        """Run the loop on a daemon thread in this process"""
+        with self._cond:
+            if self._thread is None:
+                self._looping = True
+                self._thread = threading.Thread(target=self.run, daemon=True)
+                self._thread.start()
+
+    def stats(self):
+        """Queue depth from the table plus this process's counters"""
+        now = time.time()
+        depth = {'pending': 0, 'running': 0, 'failed': 0, 'due': 0, 'next_run_in': None}
+        with self.engine.connect() as conn:
+            for status, count, first_run_at, due in conn.execute(text(DEPTH_SQL), {'now': now}):
+                depth[status] = count
+                if status == 'pending':
+                    depth['due'] = due or 0
+                    depth['next_run_in'] = round(first_run_at - now, 3)
+        with self._cond:
+            heap_size = len(self._heap) if self._looping else None
+        depth.update(worker_id=self.worker_id, heap_size=heap_size, claimed=self.claimed,
+                     completed=self.completed, errors=self.errors)
+        return depth
@@ -0,0 +1,108 @@
+"""
+Schema upkeep for CourseHub
+Brings existing databases up to the models in app.py and checks that hot queries use their indexes
+"""
+from sqlalchemy import inspect, text
+
+# Unique indexes that older databases may violate; each statement keeps one
+# row per key (merging what matters) so the index can be created
+DEDUPE_SQL = {
+    'uq_enrollment_student_course': [
+        # Keep the most advanced status (approved > pending > rejected), then the oldest row
+        """
+        DELETE FROM enrollment WHERE EXISTS (
+            SELECT 1 FROM enrollment o
+            WHERE o.student_id = enrollment.student_id AND o.course_id = enrollment.course_id
+              AND o.id <> enrollment.id
+              AND (CASE o.status WHEN 'approved' THEN 2 WHEN 'pending' THEN 1 ELSE 0 END
+                   > CASE enrollment.status WHEN 'approved' THEN 2 WHEN 'pending' THEN 1 ELSE 0 END
+                   OR (o.status = enrollment.status AND o.id < enrollment.id))
+        )
+        """,
+    ],
+    'uq_student_progress_student_chapter': [
+        # Fold duplicate rows into the oldest one: total time, completed if any copy is
+        """
+        UPDATE student_progress SET
+            time_spent = (SELECT SUM(COALESCE(d.time_spent, 0)) FROM student_progress d
+                          WHERE d.student_id = student_progress.student_id
+                            AND d.chapter_id = student_progress.chapter_id),
+            completed = EXISTS (SELECT 1 FROM student_progress d
+                                WHERE d.student_id = student_progress.student_id
+                                  AND d.chapter_id = student_progress.chapter_id AND d.completed),
+            completed_at = (SELECT MIN(d.completed_at) FROM student_progress d
+                            WHERE d.student_id = student_progress.student_id
+                              AND d.chapter_id = student_progress.chapter_id)
+        WHERE id IN (SELECT MIN(id) FROM student_progress
+                     GROUP BY student_id, chapter_id HAVING COUNT(*) > 1)
+        """,
+        """
+        DELETE FROM student_progress
+        WHERE id NOT IN (SELECT MIN(id) FROM student_progress GROUP BY student_id, chapter_id)
+        """,
+        # Summaries counted the duplicates; they are rebuilt on next read
+        "DELETE FROM course_progress_summary",
+    ],
+}
+
+# Indexes replaced by a wider one; dropped once their replacement exists
+SUPERSEDED_INDEXES = {
+    # With status in the key, cancelling a pending job can no longer be
+    # planned on ix_scheduled_job_due (status = ?) instead
+    'ix_scheduled_job_ref_status': ['ix_scheduled_job_ref'],
+}
+
+
+def upgrade_schema(engine, metadata):
+    """Add columns and indexes introduced after a database was created.
+
+    create_all only creates missing tables, so columns and indexes added to
+    existing models are applied here. Safe to run on every start.
+    """
+    inspector = inspect(engine)
+    columns = {c['name'] for c in inspector.get_columns('chapter')}
+    if 'updated_at' not in columns:
+        with engine.begin() as conn:
+            conn.execute(text('ALTER TABLE chapter ADD COLUMN updated_at TIMESTAMP'))
+            conn.execute(text('UPDATE chapter SET updated_at = created_at'))
+
+    for table in metadata.sorted_tables:
+        existing = {ix['name'] for ix in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name in existing:
+                continue
+            with engine.begin() as conn:
+                for sql in DEDUPE_SQL.get(index.name, []):
+                    touched = conn.execute(text(sql)).rowcount
+                    if touched and touched > 0:
+                        print(f'Schema upgrade: {touched} rows changed while deduplicating for {index.name}')
+                index.create(conn)
+            print(f'Schema upgrade: created index {index.name}')
+        for index in table.indexes:
+            for old in SUPERSEDED_INDEXES.get(index.name, []):
+                if old in existing:
+                    with engine.begin() as conn:
+                        conn.execute(text(f'DROP INDEX IF EXISTS {old}'))
+                    print(f'Schema upgrade: dropped index {old}, replaced by {index.name}')
+
+
+def check_query_plans(engine, queries):
+    """EXPLAIN each hot query; returns [(name, index, plan)] for those not using their index.
+
+    `queries` holds (name, statement, params, index): a raw SQL string run
+    with `params`, or a SQLAlchemy statement compiled with its own values,
+    so what is checked is what the app runs. Only sqlite plans are
+    inspected; other databases return an empty list.
+    """
+    if engine.dialect.name != 'sqlite':
+        return []
+    failures = []
+    with engine.connect() as conn:
+        for name, statement, params, index in queries:
+            if not isinstance(statement, str):
+                statement = str(statement.compile(dialect=engine.dialect, compile_kwargs={'literal_binds': True}))
+            rows = conn.execute(text('EXPLAIN QUERY PLAN ' + statement), params)
+            plan = ' | '.join(row[-1] for row in rows)
+            if f'INDEX {index}' not in plan:
+                failures.append((name, index, plan))
+    return failures
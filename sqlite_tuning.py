@@ -0,0 +1,65 @@
+"""
+SQLite tuning for CourseHub
+Connection pragmas for running several worker processes on one database file, and retries for busy writes
+"""
+import os
+import random
+import time
+
+from sqlalchemy import event
+from sqlalchemy.exc import OperationalError
+
+# Per-connection settings, applied to every new pooled connection. WAL lets
+# readers run alongside the single writer; NORMAL sync is durable across
+# application crashes (only an OS crash can lose the last commits).
+JOURNAL_MODE = os.environ.get('SQLITE_JOURNAL_MODE', 'WAL')
+BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000))
+CACHE_SIZE_KB = int(os.environ.get('SQLITE_CACHE_SIZE_KB', 16384))
+MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+
+BUSY_RETRIES = int(os.environ.get('SQLITE_BUSY_RETRIES', 5))
+BUSY_RETRY_DELAY = float(os.environ.get('SQLITE_BUSY_RETRY_DELAY', 0.05))
+
+
+def _on_connect(dbapi_conn, connection_record):
+    cursor = dbapi_conn.cursor()
+    cursor.execute(f'PRAGMA journal_mode={JOURNAL_MODE}')
+    cursor.execute('PRAGMA synchronous=NORMAL')
+    cursor.execute(f'PRAGMA busy_timeout={BUSY_TIMEOUT_MS}')
+    cursor.execute(f'PRAGMA cache_size=-{CACHE_SIZE_KB}')
+    cursor.execute(f'PRAGMA mmap_size={MMAP_SIZE}')
+    cursor.execute('PRAGMA temp_store=MEMORY')
+    cursor.close()
+
+
+def tune_sqlite(engine):
+    """Apply the pragmas above to each connection `engine` opens; other databases are left alone"""
+    if engine.dialect.name == 'sqlite' and not event.contains(engine, 'connect', _on_connect):
+        event.listen(engine, 'connect', _on_connect)
+    return engine
+
+
+def is_busy(error):
+    """Whether an error is SQLite reporting the database locked by another writer"""
+    if not isinstance(error, OperationalError):
+        return False
+    message = str(error.orig if error.orig is not None else error).lower()
+    return 'database is locked' in message or 'database is busy' in message
+
+
+def run_with_retry(fn, rollback=None, attempts=BUSY_RETRIES, delay=BUSY_RETRY_DELAY):
+    """Call `fn()`, rolling back and retrying with jittered backoff while SQLite is busy.
+
+    busy_timeout already waits for the lock; this covers what it cannot,
+    such as a read transaction in WAL mode that needs to upgrade to a write
+    after another process committed.
+    """
+    for attempt in range(attempts):
+        try:
+            return fn()
+        except OperationalError as e:
+            if not is_busy(e) or attempt == attempts - 1:
+                raise
+            if rollback is not None:
+                rollback()
+            time.sleep(delay * (2 ** attempt) * (0.5 + random.random()))